@@ -0,0 +1,107 @@
+"""
+Rows/second of the bulk expense endpoint's write path (expenses.bulk.run_bulk).
+
+Runs against a throwaway in-memory SQLite database and times, for --rows
+operations of each kind:
+
+- validate: the create payloads alone, through one ExpenseBulkRowSerializer
+            as run_bulk checks them
+- create:   run_bulk with only create operations (validation, categorization,
+            bulk_create and rollups in one transaction)
+- update:   run_bulk updating the rows just created
+- delete:   run_bulk deleting them again
+
+--uncategorized is the share of created rows sent without a category, which
+run_bulk predicts in one batch.
+
+Usage:
+    python benchmarks/bench_bulk.py [--rows 10000] [--repeat 3] [--uncategorized 0.2]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def setup_django():
+    sys.path.insert(0, ROOT)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'expense_tracker.settings')
+    from django.conf import settings
+    settings.DATABASES = {'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}}
+    import django
+    django.setup()
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+
+def create_operations(rows, uncategorized):
+    from expenses.models import Expense
+
+    categories = [choice for choice, _ in Expense.CATEGORY_CHOICES]
+    start = date(2020, 1, 1)
+    operations = []
+    for i in range(rows):
+        data = {'title': f"Expense {i}", 'amount': f"{random.randint(1, 99999) / 100:.2f}",
+                'date': (start + timedelta(days=i % 2000)).isoformat()}
+        if random.random() >= uncategorized:
+            data['category'] = random.choice(categories)
+        operations.append({'op': 'create', 'data': data})
+    return operations
+
+
+def timed(func):
+    started = time.perf_counter()
+    result = func()
+    return time.perf_counter() - started, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--uncategorized', type=float, default=0.2)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.contrib.auth.models import User
+    from expenses.bulk import MAX_OPERATIONS, run_bulk
+    from expenses.serializers import ExpenseBulkRowSerializer
+
+    if args.rows > MAX_OPERATIONS:
+        parser.error(f"--rows is at most {MAX_OPERATIONS}, the endpoint's batch limit")
+    random.seed(0)
+    user = User.objects.create_user(username='bench')
+    operations = create_operations(args.rows, args.uncategorized)
+    payloads = [operation['data'] for operation in operations]
+
+    def validate():
+        serializer = ExpenseBulkRowSerializer(context={})
+        return [serializer.run_validation(data) for data in payloads]
+
+    def run(batch):
+        results, ok = run_bulk(user, batch, context={})
+        assert ok, next(result for result in results if result['status'] == 'error')
+        return results
+
+    best = {}
+    for _ in range(args.repeat):
+        timings = {'validate': timed(validate)[0]}
+        timings['create'], results = timed(lambda: run(operations))
+        ids = [result['id'] for result in results]
+        timings['update'], _ = timed(lambda: run([{'op': 'update', 'id': pk, 'data': {'amount': '1.00'}}
+                                                  for pk in ids]))
+        timings['delete'], _ = timed(lambda: run([{'op': 'delete', 'id': pk} for pk in ids]))
+        for name, elapsed in timings.items():
+            best[name] = min(best.get(name, elapsed), elapsed)
+
+    print(f"{args.rows} operations per batch, {args.uncategorized:.0%} uncategorized creates, best of {args.repeat}")
+    for name, elapsed in best.items():
+        print(f"{name:<9} {args.rows / elapsed:>10,.0f} rows/s ({elapsed * 1000:7.1f} ms)")
+
+
+if __name__ == '__main__':
+    main()
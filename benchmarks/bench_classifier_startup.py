@@ -0,0 +1,132 @@
+"""
+Startup-time and memory benchmark for loading the expense classifier.
+
+Each scenario runs in a fresh interpreter:
+
+- lazy:  django.setup() + import expenses.views (model not loaded yet)
+- eager: the same, then load the model (what every worker used to do)
+- mmap:  eager load with EXPENSE_CLASSIFIER_MMAP_MODE='r'
+- fork:  load once in a parent, fork workers that predict, and report each
+         worker's private vs shared memory (Linux /proc only)
+
+Usage:
+    python benchmarks/bench_classifier_startup.py [--workers 4]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def memory_kb(pid='self'):
+    """Return RSS/PSS/private/shared memory in kB from /proc (empty off Linux)."""
+    fields = {'Rss': 'rss', 'Pss': 'pss', 'Private_Clean': 'private', 'Private_Dirty': 'private',
+              'Shared_Clean': 'shared', 'Shared_Dirty': 'shared'}
+    result = {}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                name, _, value = line.partition(':')
+                if name in fields:
+                    key = fields[name]
+                    result[key] = result.get(key, 0) + int(value.split()[0])
+    except OSError:
+        import resource
+        result['rss'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return result
+
+
+def setup_django():
+    sys.path.insert(0, ROOT)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'expense_tracker.settings')
+    import django
+    django.setup()
+    import expenses.views  # noqa: F401  (what a worker imports to serve requests)
+
+
+def run_scenario(mode):
+    if mode == 'mmap':
+        os.environ['EXPENSE_CLASSIFIER_MMAP_MODE'] = 'r'
+    started = time.perf_counter()
+    setup_django()
+    import_seconds = time.perf_counter() - started
+
+    from expenses import ai_utils
+    load_started = time.perf_counter()
+    if mode != 'lazy':
+        ai_utils.preload_model()
+    load_seconds = time.perf_counter() - load_started
+
+    return {
+        'mode': mode,
+        'import_seconds': round(import_seconds, 4),
+        'model_load_seconds': round(load_seconds, 4),
+        'ready_seconds': round(import_seconds + load_seconds, 4),
+        'memory_kb': memory_kb(),
+    }
+
+
+def run_fork(workers):
+    setup_django()
+    from expenses import ai_utils
+    ai_utils.preload_model()
+    import gc
+    gc.freeze()
+
+    children = []
+    for _ in range(workers):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            ai_utils.predict_categories(['uber ride', 'netflix', 'pizza'])
+            with os.fdopen(write_fd, 'w') as out:
+                out.write(json.dumps(memory_kb()))
+            os._exit(0)
+        os.close(write_fd)
+        children.append((pid, read_fd))
+
+    reports = []
+    for pid, read_fd in children:
+        with os.fdopen(read_fd) as f:
+            reports.append(json.loads(f.read()))
+        os.waitpid(pid, 0)
+    return {'mode': 'fork', 'workers': workers, 'parent_memory_kb': memory_kb(), 'worker_memory_kb': reports}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenario', choices=['lazy', 'eager', 'mmap', 'fork'])
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    if args.scenario == 'fork':
+        print(json.dumps(run_fork(args.workers)))
+        return
+    if args.scenario:
+        print(json.dumps(run_scenario(args.scenario)))
+        return
+
+    for scenario in ['lazy', 'eager', 'mmap'] + (['fork'] if hasattr(os, 'fork') else []):
+        output = subprocess.run(
+            [sys.executable, '-W', 'ignore', __file__, '--scenario', scenario, '--workers', str(args.workers)],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip().splitlines()[-1]
+        report = json.loads(output)
+        if scenario == 'fork':
+            for i, worker in enumerate(report['worker_memory_kb'], 1):
+                print(f"fork   worker {i}: private={worker.get('private', 0):>7} kB  "
+                      f"shared={worker.get('shared', 0):>7} kB  pss={worker.get('pss', 0):>7} kB")
+        else:
+            memory = report['memory_kb']
+            print(f"{scenario:<6} ready in {report['ready_seconds']:.3f}s "
+                  f"(import {report['import_seconds']:.3f}s + model {report['model_load_seconds']:.3f}s)  "
+                  f"rss={memory.get('rss', 0)} kB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Rows/second of the expense list serialization paths.
+
+Runs against a throwaway in-memory SQLite database filled with --rows
+expenses for one user and compares, for the same rows:
+
+- model:  queryset of Expense instances (with the select_related('user') the
+          list used to do) through ExpenseListSerializer(many=True)
+- fast:   values_list(named=True) rows through ExpenseRowSerializer
+
+Each path is timed end to end (query + serialization) and for serialization
+alone, and the outputs are checked to render to identical JSON.
+
+Usage:
+    python benchmarks/bench_list_serializer.py [--rows 50000] [--repeat 3]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def setup_django():
+    sys.path.insert(0, ROOT)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'expense_tracker.settings')
+    from django.conf import settings
+    settings.DATABASES = {'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}}
+    import django
+    django.setup()
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+
+def fill(rows):
+    from django.contrib.auth.models import User
+    from expenses.models import Expense
+
+    user = User.objects.create_user(username='bench')
+    categories = [choice for choice, _ in Expense.CATEGORY_CHOICES]
+    start = date(2020, 1, 1)
+    Expense.objects.bulk_create(
+        (Expense(user=user, title=f"Expense {i}", amount=Decimal(random.randint(1, 99999)) / 100,
+                 category=random.choice(categories), date=start + timedelta(days=i % 2000))
+         for i in range(rows)),
+        batch_size=5000,
+    )
+    return user
+
+
+def best_of(repeat, func):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    setup_django()
+    from rest_framework.renderers import JSONRenderer
+    from expenses.models import Expense
+    from expenses.serializers import ExpenseListSerializer, ExpenseRowSerializer
+
+    random.seed(0)
+    user = fill(args.rows)
+    qs = Expense.objects.filter(user=user).order_by('-date', '-id')
+    row_serializer = ExpenseRowSerializer.for_fields()
+
+    def model_path():
+        return ExpenseListSerializer(list(qs.select_related('user')), many=True).data
+
+    def fast_path():
+        return row_serializer.serialize(list(qs.values_list(*row_serializer.source_fields, named=True)))
+
+    instances = list(qs.select_related('user'))
+    rows = list(qs.values_list(*row_serializer.source_fields, named=True))
+    results = {
+        'model': (best_of(args.repeat, model_path),
+                  best_of(args.repeat, lambda: ExpenseListSerializer(instances, many=True).data)),
+        'fast': (best_of(args.repeat, fast_path),
+                 best_of(args.repeat, lambda: row_serializer.serialize(rows))),
+    }
+
+    renderer = JSONRenderer()
+    same = renderer.render(results['model'][0][1]) == renderer.render(results['fast'][0][1])
+    print(f"{args.rows} rows, best of {args.repeat}; identical JSON: {same}")
+    for name, ((total, _), (serialize_only, _)) in results.items():
+        print(f"{name:<6} end-to-end {args.rows / total:>10,.0f} rows/s ({total * 1000:7.1f} ms)   "
+              f"serialize only {args.rows / serialize_only:>10,.0f} rows/s ({serialize_only * 1000:7.1f} ms)")
+    speedup = results['model'][0][0] / results['fast'][0][0]
+    print(f"fast path end-to-end speedup: {speedup:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
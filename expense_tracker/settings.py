@@ -13,6 +13,50 @@ except ImportError:
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Versioned classifier artifacts; workers check the active version at most
+# every EXPENSE_CLASSIFIER_RELOAD_INTERVAL seconds and hot-swap it.
+EXPENSE_CLASSIFIER_REGISTRY = os.environ.get(
+    'EXPENSE_CLASSIFIER_REGISTRY', os.path.join(BASE_DIR, 'expenses', 'models', 'registry'))
+EXPENSE_CLASSIFIER_RELOAD_INTERVAL = 5
+
+# Expense classifier loading: set to 'r' to memory-map the model's arrays so
+# forked gunicorn workers share them (see gunicorn.conf.py).
+EXPENSE_CLASSIFIER_MMAP_MODE = os.environ.get('EXPENSE_CLASSIFIER_MMAP_MODE') or None
+
+# Keyword table ({category: [keywords]}) used to categorize expenses by title
+# when the classifier can't; defaults to expenses.keywords.DEFAULT_CATEGORY_KEYWORDS.
+# EXPENSE_CATEGORY_KEYWORDS = {...}
+
+# Per-user summary cache (expenses/caching.py). LocMemCache evicts the least
+# recently used entries past MAX_ENTRIES; TIMEOUT is the TTL in seconds.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'expense-tracker',
+        'TIMEOUT': 300,
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+}
+EXPENSE_CACHE_ALIAS = 'default'
+EXPENSE_CACHE_TIMEOUT = 300
+
+# Live dashboard feed (expenses/live.py). In-process by default; set a Redis
+# URL (e.g. redis://localhost:6379/0, needs the `redis` package) when expense
+# writes and the /async/live/ streams run in different processes.
+EXPENSE_LIVE_REDIS_URL = os.environ.get('EXPENSE_LIVE_REDIS_URL') or None
+# Pages rendered under ASGI always open the feed. Set this when they are
+# rendered by gunicorn (WSGI) but /async/live/ is routed to an ASGI server.
+EXPENSE_LIVE_UPDATES = os.environ.get('EXPENSE_LIVE_UPDATES', 'False') == 'True'
+
+# Background jobs (expenses/jobs.py), run by `manage.py run_worker`. Summaries
+# spanning more than EXPENSE_SYNC_REPORT_DAYS days answer 202 with a job.
+EXPENSE_WORKER_PROCESSES = None  # pool size; None: one per CPU
+EXPENSE_JOB_LEASE_SECONDS = 300  # a job whose worker stops renewing this is retried
+EXPENSE_JOB_MAX_ATTEMPTS = 3
+EXPENSE_JOB_RETRY_DELAY = 30  # seconds before the first retry, doubling after
+EXPENSE_JOB_RESULT_DAYS = 7  # finished jobs and their result files are deleted after this
+EXPENSE_SYNC_REPORT_DAYS = 366
+
 # Application definition
 INSTALLED_APPS = [
     'django.contrib.admin',
@@ -13,6 +13,8 @@ urlpatterns = [
 
     # Include app URLs
     path('', include('expenses.urls')),
+    # Async versions of the chatbot/summary views, for ASGI servers
+    path('async/', include('expenses.async_urls')),
     
     # API URLs
     path('api/', include('expenses.api_urls')),
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Expense, Profile
+from .models import Expense, ExpenseDailyRollup, Job, Profile
 
 @admin.register(Expense)
 class ExpenseAdmin(admin.ModelAdmin):
@@ -9,6 +9,21 @@ class ExpenseAdmin(admin.ModelAdmin):
     date_hierarchy = 'date'
     ordering = ('-date',)
 
+@admin.register(ExpenseDailyRollup)
+class ExpenseDailyRollupAdmin(admin.ModelAdmin):
+    list_display = ('user', 'date', 'category', 'total', 'count')
+    list_filter = ('category',)
+    search_fields = ('user__username',)
+    date_hierarchy = 'date'
+    ordering = ('-date',)
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('kind', 'user', 'status', 'attempts', 'created_at', 'finished_at')
+    list_filter = ('status', 'kind')
+    search_fields = ('user__username',)
+    ordering = ('-created_at',)
+
 @admin.register(Profile)
 class ProfileAdmin(admin.ModelAdmin):
     list_display = ('user', 'bio')
@@ -1,68 +1,192 @@
 # expenses/ai_utils.py
-import joblib
 import os
+import threading
+import time
+from collections import OrderedDict
+
+from .keywords import get_matcher
 
 MODEL_PATH = os.path.join(os.path.dirname(__file__), 'models', 'expense_classifier.pkl')
 
-# canonical choices used in model and forms (must match Expense.CATEGORY_CHOICES)
-CANONICAL = {
-    'food': 'Food',
-    'pizza': 'Food',
-    'restaurant': 'Food',
-    'groceries': 'Food',
-    'transport': 'Travel',
-    'uber': 'Travel',
-    'bus': 'Travel',
-    'travel': 'Travel',
-    'entertainment': 'Entertainment',
-    'movie': 'Entertainment',
-    'netflix': 'Entertainment',
-    'utilities': 'Utilities',
-    'electricity': 'Utilities',
-    'sharing': 'Sharing',
-    'other': 'Other',
-    'others': 'Other',
-}
-
-model_tuple = None
-if os.path.exists(MODEL_PATH):
-    model_tuple = joblib.load(MODEL_PATH)  # expecting (vectorizer, model)
+# The classifier is loaded on first use (see get_active_model), not at import
+# time, so workers, management commands and tests don't pay for unpickling
+# sklearn until something is actually categorized. Afterwards the registry's
+# CURRENT pointer is stat()ed at most every EXPENSE_CLASSIFIER_RELOAD_INTERVAL
+# seconds and a newly activated version is swapped in atomically.
+LEGACY_VERSION = 'legacy'
+_active = None  # (version, (vectorizer, model) or None)
+_pointer_stamp = None
+_last_check = 0.0
+_model_lock = threading.Lock()
+
+
+def _setting(name, default=None):
+    from django.conf import settings
+    return getattr(settings, name, default)
+
+
+def load_model(path=MODEL_PATH, mmap_mode=None):
+    """
+    Unpickle a (vectorizer, model) artifact. With mmap_mode='r' numpy arrays
+    stored uncompressed are memory-mapped, so forked workers share the pages.
+    """
+    import joblib
+    if not os.path.exists(path):
+        return None
+    return joblib.load(path, mmap_mode=mmap_mode)
+
+
+def _load_active(registry, stamp):
+    global _active, _pointer_stamp
+    version = registry.active_version()
+    mmap_mode = _setting('EXPENSE_CLASSIFIER_MMAP_MODE')
+    if _active is not None and _active[0] == (version or LEGACY_VERSION):
+        artifact = _active[1]
+    elif version is None:
+        artifact = load_model(MODEL_PATH, mmap_mode=mmap_mode)
+    else:
+        artifact = load_model(registry.artifact_path(version), mmap_mode=mmap_mode)
+    # a single reference assignment: in-flight predictions keep the pair they took
+    _active = (version or LEGACY_VERSION, artifact)
+    _pointer_stamp = stamp
+
+
+def get_active_model():
+    """Return (version, (vectorizer, model) or None), reloading when a new version is activated."""
+    global _last_check
+    from .classifier_registry import get_registry
+
+    active = _active
+    interval = _setting('EXPENSE_CLASSIFIER_RELOAD_INTERVAL', 5)
+    if active is not None and time.monotonic() - _last_check < interval:
+        return active
+    # only the first caller loads; the others keep using the current model
+    if not _model_lock.acquire(blocking=active is None):
+        return active
+    try:
+        if _active is None or time.monotonic() - _last_check >= interval:
+            _last_check = time.monotonic()
+            registry = get_registry()
+            stamp = registry.pointer_stamp()
+            if _active is None or stamp != _pointer_stamp:
+                _load_active(registry, stamp)
+        return _active
+    finally:
+        _model_lock.release()
+
+
+def get_model():
+    """Return the active (vectorizer, model) pair, or None."""
+    return get_active_model()[1]
+
+
+def current_model_version():
+    return get_active_model()[0]
+
+
+def preload_model():
+    """Load the classifier now, e.g. in the gunicorn master before forking."""
+    return get_model() is not None
 
 def normalize_prediction(pred):
     """Map model/fallback outputs to one of the Expense.CATEGORY_CHOICES values."""
     if not pred:
         return 'Other'
-    key = str(pred).lower()
-    # direct map
-    if key in CANONICAL:
-        return CANONICAL[key]
-    # fallback heuristics
-    for k, v in CANONICAL.items():
-        if k in key:
-            return v
-    # if unknown, return Other
-    return 'Other'
+    matcher = get_matcher()
+    # a known label or alias, else the first keyword inside it, else Other
+    return matcher.exact(pred) or matcher.search(pred) or 'Other'
+
+def _split_model(model_tuple):
+    """Return (vectorizer, model) whichever order the artifact stored them in."""
+    first, second = model_tuple
+    if hasattr(first, 'transform'):
+        return first, second
+    return second, first
 
-def predict_category(text: str) -> str:
-    """Return a canonical category (one of Expense choices)."""
-    text = (text or '').strip()
-    if not text:
-        return 'Other'
 
-    # if model file exists, use it
-    if model_tuple:
-        vectorizer, model = model_tuple
+def _fallback_category(text: str) -> str:
+    """Rule-based category from the keyword table (see keywords.py)."""
+    return get_matcher().search(text) or 'Other'
+
+
+def normalize_text(text) -> str:
+    """Cache/model key for an expense text: lower-cased, whitespace collapsed."""
+    return ' '.join(str(text or '').lower().split())
+
+
+class LRUCache:
+    """Small thread-safe LRU mapping with a fixed number of entries."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._data:
+                    self._data.move_to_end(key)
+                    found[key] = self._data[key]
+        return found
+
+    def set_many(self, items):
+        with self._lock:
+            for key, value in items.items():
+                self._data[key] = value
+                self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+# Merchants repeat constantly ("uber", "netflix"), so remember recent answers
+# per model version.
+PREDICTION_CACHE_SIZE = 4096
+prediction_cache = LRUCache(PREDICTION_CACHE_SIZE)
+
+
+def _predict_uncached(texts, artifact):
+    """Predict normalized, non-empty texts with one transform/predict call."""
+    predictions = [None] * len(texts)
+    if artifact:
+        vectorizer, model = _split_model(artifact)
         try:
-            X = vectorizer.transform([text])
-            pred = model.predict(X)[0]
-            return normalize_prediction(pred)
+            predictions = [normalize_prediction(pred) for pred in model.predict(vectorizer.transform(texts))]
         except Exception as e:
             print("ai_utils: model prediction failed:", e)
 
-    # fallback rule-based
-    t = text.lower()
-    for k, v in CANONICAL.items():
-        if k in t:
-            return v
+    return [pred or _fallback_category(text) for pred, text in zip(predictions, texts)]
+
+
+def predict_categories(texts, return_version=False):
+    """
+    Return a canonical category for each text, in order
+    (and the model version used, when return_version=True).
 
-    return 'Other'
+    Texts are normalized and de-duplicated; cache misses are transformed and
+    predicted together as one sparse matrix.
+    """
+    version, artifact = get_active_model()
+    keys = [normalize_text(text) for text in texts]
+    unique = {(version, key) for key in keys if key}
+    results = prediction_cache.get_many(unique)
+    misses = [key for key in unique if key not in results]
+    if misses:
+        computed = dict(zip(misses, _predict_uncached([text for _, text in misses], artifact)))
+        prediction_cache.set_many(computed)
+        results.update(computed)
+    categories = [results[(version, key)] if key else 'Other' for key in keys]
+    return (categories, version) if return_version else categories
+
+
+def predict_category(text: str) -> str:
+    """Return a canonical category (one of Expense choices)."""
+    return predict_categories([text])[0]
@@ -3,12 +3,13 @@ API URL routing for Expense Tracker.
 """
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .api_views import ExpenseViewSet, ProfileViewSet
+from .api_views import ExpenseViewSet, JobViewSet, ProfileViewSet
 
 # Create router and register viewsets
 router = DefaultRouter()
 router.register(r'expenses', ExpenseViewSet, basename='expense')
 router.register(r'profiles', ProfileViewSet, basename='profile')
+router.register(r'jobs', JobViewSet, basename='job')
 
 app_name = 'api'
 
@@ -5,40 +5,141 @@ Provides CRUD operations for Expenses and Profiles.
 from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Sum, Count
+from django.conf import settings
+from django.db.models import Sum
+from django.http import FileResponse, StreamingHttpResponse
+from django.db.models.functions import TruncMonth
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_headers
 from datetime import datetime, timedelta
+from functools import partial
+import hashlib
 
-from .models import Expense, Profile
+from . import jobs, periods
+from .bulk import MAX_OPERATIONS, run_bulk
+from .caching import cache_stats, cached, request_data_version
+from .columnar import LayoutError, requested_layout
+from .exports import STREAMERS, export_rows, stream_ndjson_columnar
+from .models import Expense, ExpenseDailyRollup, Job, Profile
+from .money import cents_to_float
+from .pagination import ExpenseCursorPagination
+from .renderers import CSVRenderer, NDJSONRenderer
+from .search import ExpenseSearchFilter
 from .serializers import (ExpenseSerializer, ExpenseListSerializer, ExpenseDetailSerializer,
-    ProfileSerializer, UserSerializer)
+    ExpenseRowSerializer, JobSerializer, ProfileSerializer, UserSerializer)
 
 
+def _data_etag(request, *args, **kwargs):
+    """
+    Strong ETag for a read of the user's expense data: it changes with the
+    user's data version, the exact URL and the negotiated format. Today's date
+    is included because default date windows move without any write.
+    """
+    version = request_data_version(request)
+    if version is None:
+        return None
+    return data_etag(request, request.user.id, version)
+
+
+def data_etag(request, user_id, version):
+    key = '|'.join([str(user_id), str(version), request.build_absolute_uri(),
+                    request.META.get('HTTP_ACCEPT', ''), periods.today().isoformat()])
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+# Responses negotiate their format from Accept, which the ETag hashes too;
+# say so explicitly rather than relying on DRF adding it for multiple renderers
+vary_on_accept = method_decorator(vary_on_headers('Accept'))
+
+# 304 Not Modified on a matching If-None-Match, before any queryset is evaluated
+conditional_on_data = method_decorator([vary_on_headers('Accept'), condition(etag_func=_data_etag)])
+
+
+def wants_background(request, days=None):
+    """
+    Whether to run a report as a background job: asked for with ?background=1,
+    or spanning more than EXPENSE_SYNC_REPORT_DAYS days. Takes DRF and plain
+    (async view) requests alike.
+    """
+    if request.GET.get('background', '').lower() in ('1', 'true', 'yes'):
+        return True
+    return days is not None and days > getattr(settings, 'EXPENSE_SYNC_REPORT_DAYS', 366)
+
+
+def job_status(request, job):
+    """The job's status as /api/jobs/<id>/ shows it."""
+    return JobSerializer(job, context={'request': request}).data
+
+
+def accepted(request, job):
+    """202 Accepted with the job's status; poll its url, then fetch download_url."""
+    data = job_status(request, job)
+    return Response(data, status=status.HTTP_202_ACCEPTED, headers={'Location': data['url']})
+
 
 class ExpenseViewSet(viewsets.ModelViewSet):
     """
     API ViewSet for Expense CRUD operations.
     
     Endpoints:
-    - GET /api/expenses/ - List all user expenses (paginated)
+    - GET /api/expenses/ - List all user expenses (cursor paginated, ?fields= for sparse rows,
+      ?search= full-text search, ?ordering=-search_rank for relevance,
+      ?layout=columnar[&dictionary=category] for one array per field)
     - POST /api/expenses/ - Create new expense
     - GET /api/expenses/{id}/ - Get expense detail
     - PUT /api/expenses/{id}/ - Update expense
     - DELETE /api/expenses/{id}/ - Delete expense
+    - POST /api/expenses/bulk/ - Batched create/update/delete
+    - GET /api/expenses/export/?format=csv|ndjson - Streamed export (ndjson also ?layout=columnar)
     - GET /api/expenses/stats/summary/ - Get expense summary stats
+    (export, summary and monthly_stats take ?background=1 to answer 202 with a job; see JobViewSet)
+    - GET /api/expenses/cache_stats/ - Summary cache hit/miss counters (admins only)
     """
     permission_classes = [IsAuthenticated]
-    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, filters.SearchFilter]
+    filter_backends = [DjangoFilterBackend, ExpenseSearchFilter, filters.OrderingFilter]
     filterset_fields = ['category', 'date']
-    ordering_fields = ['date', 'amount']
-    ordering = ['-date']
-    search_fields = ['title', 'description']
-    pagination_class = None  # Can add LimitOffsetPagination if needed
+    ordering_fields = ['date', 'amount', 'search_rank']
+    ordering = ['-date', '-id']
+    pagination_class = ExpenseCursorPagination
     
     def get_queryset(self):
         """Return only expenses belonging to authenticated user."""
-        return Expense.objects.filter(user=self.request.user).select_related('user')
+        qs = Expense.objects.filter(user=self.request.user)
+        if self.action == 'list':
+            # list reads plain column tuples (see list()); nothing to join
+            return qs
+        return qs.select_related('user')
+    
+    @conditional_on_data
+    def list(self, request, *args, **kwargs):
+        """
+        Same output as ExpenseListSerializer, built from values_list() rows
+        holding only the requested columns plus what ordering/cursors read.
+        With ?layout=columnar, "results" holds one array per field instead.
+        """
+        try:
+            columnar, dictionary = requested_layout(request)
+        except LayoutError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        fields = ExpenseListSerializer.requested_fields(request)
+        row_serializer = ExpenseRowSerializer.for_fields(tuple(fields) if fields else None)
+        queryset = self.filter_queryset(self.get_queryset())
+        ordering_columns = [name for name in ('id', 'date', 'amount') if name not in row_serializer.source_fields]
+        if 'search_rank' in queryset.query.annotations:
+            ordering_columns.append('search_rank')
+        rows = queryset.values_list(*row_serializer.source_fields, *ordering_columns, named=True)
+        
+        if columnar:
+            serialize = partial(row_serializer.serialize_columns, dictionary=dictionary)
+        else:
+            serialize = row_serializer.serialize
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(serialize(page))
+        return Response(serialize(rows))
     
     def get_serializer_class(self):
         """Use appropriate serializer based on action."""
@@ -54,9 +155,74 @@ class ExpenseViewSet(viewsets.ModelViewSet):
     
     def perform_update(self, serializer):
         """Ensure user cannot change owner of expense."""
-        serializer.save(user=self.request.user)
+        if serializer.validated_data.get('category', serializer.instance.category) != serializer.instance.category:
+            # a manual correction: no longer the classifier's answer
+            serializer.save(user=self.request.user, category_model_version=None)
+        else:
+            serializer.save(user=self.request.user)
+    
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated])
+    def bulk(self, request):
+        """
+        Apply many create/update/delete operations in one transaction.
+        
+        Body: {"operations": [
+            {"op": "create", "data": {...}},
+            {"op": "update", "id": 1, "data": {...}},
+            {"op": "delete", "id": 2}
+        ]}
+        
+        Returns: per-operation results. Nothing is written (400) if any
+        operation is invalid.
+        """
+        operations = request.data.get('operations') if isinstance(request.data, dict) else None
+        if not isinstance(operations, list) or not operations:
+            return Response({'detail': 'Expected a non-empty "operations" list.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(operations) > MAX_OPERATIONS:
+            return Response({'detail': f'At most {MAX_OPERATIONS} operations per request.'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        results, ok = run_bulk(request.user, operations, self.get_serializer_context())
+        return Response({'results': results}, status=status.HTTP_200_OK if ok else status.HTTP_400_BAD_REQUEST)
+    
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated],
+            renderer_classes=[CSVRenderer, NDJSONRenderer])
+    @vary_on_accept
+    def export(self, request):
+        """
+        Stream the user's expenses as CSV or NDJSON.
+        
+        Query params:
+        - format: csv (default) or ndjson
+        - layout: columnar (ndjson only) for one {"id": [...], ...} line per batch of rows,
+          with dictionary=category to dictionary encode categories
+        - category / date / search / ordering: same filters as the list
+        - background: 1 to build the file in a background job (202; newest first,
+          no ordering or layout)
+        """
+        fmt = request.accepted_renderer.format
+        background = wants_background(request)
+        try:
+            columnar, dictionary = requested_layout(request)
+            if columnar and fmt != 'ndjson':
+                raise LayoutError("layout=columnar requires format=ndjson.")
+            if columnar and background:
+                raise LayoutError("layout=columnar is not available with background=1.")
+        except LayoutError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if background:
+            params = {name: request.query_params[name] for name in ('category', 'date', 'search')
+                      if request.query_params.get(name)}
+            return accepted(request, jobs.enqueue(request.user, f'export_{fmt}', params))
+        content_type, streamer = STREAMERS[fmt]
+        qs = self.filter_queryset(self.get_queryset())
+        rows = export_rows(qs)
+        stream = stream_ndjson_columnar(rows, dictionary) if columnar else streamer(rows)
+        response = StreamingHttpResponse(stream, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="expenses.{fmt}"'
+        return response
     
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
+    @conditional_on_data
     def summary(self, request):
         """
         Get expense summary stats for authenticated user.
@@ -64,84 +230,224 @@ class ExpenseViewSet(viewsets.ModelViewSet):
         Query params:
         - start_date: YYYY-MM-DD (default: 30 days ago)
         - end_date: YYYY-MM-DD (default: today)
+        - period: day, week, month, quarter or year instead of start/end_date,
+          with optional offset (e.g. period=month&offset=-1 for last month)
         - category: category name (optional)
+        - group_by: comma separated, e.g. category,month (optional)
+        - background: 1 to run as a background job; automatic past
+          EXPENSE_SYNC_REPORT_DAYS days (202 with the job's status)
         
-        Returns: total, count, by_category
+        Returns: total, count, average, by_category
+        (and by_category_month when grouping by month)
         """
-        # Get date range from query params
-        start_date = request.query_params.get('start_date')
-        end_date = request.query_params.get('end_date')
-        category = request.query_params.get('category')
-        
+        try:
+            params = summary_params(request.query_params)
+        except SummaryParamError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if wants_background(request, summary_days(params)):
+            return accepted(request, jobs.enqueue(request.user, 'summary', summary_query(params)))
+        data = cached(request.user.id, 'summary', params.items(),
+                      lambda: summary_data(list(summary_queryset(request.user, **params)), **params),
+                      version=request_data_version(request))
+        return Response(data)
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def cache_stats(self, request):
+        """Hit/miss counters of the summary cache in this worker process."""
+        return Response(cache_stats())
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
+    @conditional_on_data
+    def monthly_stats(self, request):
+        """
+        Get monthly expense breakdown for the last 12 calendar months.
+        Returns: list of {month, total, count}
+        """
+        if wants_background(request):
+            return accepted(request, jobs.enqueue(request.user, 'monthly_stats'))
+        last_12_months = monthly_stats_period()
+        return Response(cached(request.user.id, 'monthly_stats', [('period', last_12_months)],
+                               lambda: monthly_stats_data(list(monthly_stats_queryset(request.user, last_12_months))),
+                               version=request_data_version(request)))
+
+
+# Query building and result shaping shared with the async views (async_views.py),
+# which run the same querysets on the async ORM.
+
+class SummaryParamError(ValueError):
+    """Unsupported summary query parameter (a 400 response)."""
+
+
+def summary_params(query_params):
+    """Parse the summary query string into summary_queryset()/summary_data() keyword arguments."""
+    start_date = query_params.get('start_date')
+    end_date = query_params.get('end_date')
+    category = query_params.get('category')
+    group_by = [g.strip() for g in query_params.get('group_by', 'category').split(',')]
+    if not set(group_by) <= {'category', 'month'}:
+        raise SummaryParamError('group_by accepts: category, month.')
+    
+    period_name = query_params.get('period')
+    if period_name:
+        if period_name not in periods.PERIODS:
+            raise SummaryParamError(f"period accepts: {', '.join(periods.PERIODS)}.")
+        try:
+            offset = int(query_params.get('offset', 0))
+        except ValueError:
+            raise SummaryParamError('offset must be an integer.')
+        try:
+            period = periods.PERIODS[period_name](offset=offset)
+        except (ValueError, OverflowError):
+            # the period would start before year 1 or after year 9999
+            raise SummaryParamError('offset is out of range.')
+        start_date, end_date = period.start, period.last_day
+    else:
         if start_date:
             start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
         else:
-            start_date = datetime.now().date() - timedelta(days=30)
+            start_date = periods.today() - timedelta(days=30)
         
         if end_date:
             end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
         else:
-            end_date = datetime.now().date()
-        
-        # Filter queryset
-        qs = self.get_queryset().filter(date__range=[start_date, end_date])
-        if category:
-            qs = qs.filter(category=category)
-        
-        # Calculate stats
-        total = qs.aggregate(total=Sum('amount'))['total'] or 0
-        count = qs.count()
-        
-        # Group by category
-        category_stats = []
-        for cat in dict(Expense.CATEGORY_CHOICES).keys():
-            cat_total = qs.filter(category=cat).aggregate(total=Sum('amount'))['total'] or 0
-            cat_count = qs.filter(category=cat).count()
-            if cat_count > 0:
-                category_stats.append({
-                    'category': cat,
-                    'total': float(cat_total),
-                    'count': cat_count,
-                    'average': float(cat_total / cat_count) if cat_count > 0 else 0
-                })
-        
-        return Response({
-            'start_date': start_date,
-            'end_date': end_date,
-            'total_amount': float(total),
-            'expense_count': count,
-            'average_expense': float(total / count) if count > 0 else 0,
-            'by_category': category_stats
-        })
+            end_date = periods.today()
     
-    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
-    def monthly_stats(self, request):
-        """
-        Get monthly expense breakdown for the last 12 months.
-        Returns: list of {month, total, count}
-        """
-        from django.db.models.functions import TruncMonth
-        
-        twelve_months_ago = datetime.now().date() - timedelta(days=365)
-        qs = self.get_queryset().filter(date__gte=twelve_months_ago)
-        
-        monthly_data = (
-            qs.annotate(month=TruncMonth('date'))
-            .values('month')
-            .annotate(total=Sum('amount'), count=Count('id'))
-            .order_by('month')
-        )
-        
-        return Response([
+    return {'start_date': start_date, 'end_date': end_date, 'category': category, 'group_by': tuple(group_by)}
+
+
+def summary_days(params):
+    """Number of days a summary_params() range covers."""
+    return (params['end_date'] - params['start_date']).days + 1
+
+
+def summary_query(params):
+    """summary_params() output back as query parameters, e.g. for a background job."""
+    query = {'start_date': params['start_date'].isoformat(), 'end_date': params['end_date'].isoformat(),
+             'group_by': ','.join(params['group_by'])}
+    if params['category']:
+        query['category'] = params['category']
+    return query
+
+
+def summary_queryset(user, start_date, end_date, category, group_by):
+    """One grouped query over the daily rollups: per-category rows (plus month when requested)."""
+    qs = ExpenseDailyRollup.objects.filter(user=user, **periods.between(start_date, end_date).filter_kwargs())
+    if category:
+        qs = qs.filter(category=category)
+    
+    group_fields = ['category']
+    if 'month' in group_by:
+        qs = qs.annotate(month=TruncMonth('date'))
+        group_fields.append('month')
+    return (
+        qs.values(*group_fields)
+        .annotate(group_total=Sum('total_cents'), group_count=Sum('count'))
+        .order_by(*group_fields)
+    )
+
+
+def summary_data(rows, start_date, end_date, category, group_by):
+    # Fold the grouped rows into overall and per-category totals (integer cents)
+    total, count = 0, 0
+    by_category = {}
+    for row in rows:
+        total += row['group_total']
+        count += row['group_count']
+        cat = by_category.setdefault(row['category'], {'total': 0, 'count': 0})
+        cat['total'] += row['group_total']
+        cat['count'] += row['group_count']
+
+    category_stats = [
+        {
+            'category': cat,
+            'total': cents_to_float(stats['total']),
+            'count': stats['count'],
+            'average': cents_to_float(stats['total'], stats['count']),
+        }
+        for cat in dict(Expense.CATEGORY_CHOICES).keys()
+        if (stats := by_category.get(cat))
+    ]
+
+    data = {
+        'start_date': start_date,
+        'end_date': end_date,
+        'total_amount': cents_to_float(total),
+        'expense_count': count,
+        'average_expense': cents_to_float(total, count) if count > 0 else 0,
+        'by_category': category_stats
+    }
+    if 'month' in group_by:
+        data['by_category_month'] = [
             {
-                'month': item['month'],
-                'total': float(item['total'] or 0),
-                'count': item['count']
+                'category': row['category'],
+                'month': row['month'],
+                'total': cents_to_float(row['group_total']),
+                'count': row['group_count'],
             }
-            for item in monthly_data
-        ])
+            for row in rows
+        ]
+    return data
+
+
+def monthly_stats_period():
+    """The last 12 calendar months, this one included."""
+    return periods.span(periods.month(offset=-11), periods.month())
+
+
+def monthly_stats_queryset(user, period):
+    return (
+        ExpenseDailyRollup.objects.filter(user=user, **period.filter_kwargs())
+        .annotate(month=TruncMonth('date'))
+        .values('month')
+        .annotate(month_total=Sum('total_cents'), month_count=Sum('count'))
+        .order_by('month')
+    )
 
 
+def monthly_stats_data(rows):
+    return [
+        {
+            'month': item['month'],
+            'total': cents_to_float(item['month_total']),
+            'count': item['month_count']
+        }
+        for item in rows
+    ]
+
+class JobViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Background jobs of the authenticated user (see jobs.py).
+    
+    Endpoints:
+    - GET /api/jobs/ - List jobs, newest first (?kind=, ?status=)
+    - GET /api/jobs/{id}/ - Job status
+    - GET /api/jobs/{id}/download/ - Result file of a succeeded job (409 until then,
+      410 once the file is gone)
+    """
+    serializer_class = JobSerializer
+    permission_classes = [IsAuthenticated]
+    filterset_fields = ['kind', 'status']
+    ordering = ['-created_at', '-id']
+    
+    def get_queryset(self):
+        return Job.objects.filter(user=self.request.user)
+    
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        job = self.get_object()
+        if job.status != Job.SUCCEEDED:
+            return Response({'detail': 'The result is not ready.', 'status': job.status},
+                            status=status.HTTP_409_CONFLICT)
+        kind = jobs.JOB_KINDS[job.kind]
+        try:
+            result = job.result.open('rb')
+        except FileNotFoundError:
+            # expired, or written to storage this host can't see
+            return Response({'detail': 'The result file is no longer available; request the report again.',
+                             'status': job.status}, status=status.HTTP_410_GONE)
+        return FileResponse(result, as_attachment=True,
+                            filename=f"{job.kind}-{job.pk}.{kind.extension}", content_type=kind.content_type)
+
 class ProfileViewSet(viewsets.ModelViewSet):
     """
     API ViewSet for user Profile operations.
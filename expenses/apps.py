@@ -6,4 +6,7 @@ class ExpensesConfig(AppConfig):
     name = 'expenses'
 
     def ready(self):
-        import expenses.signals
\ No newline at end of file
+        import expenses.signals
+        from django.db.models.signals import post_migrate
+        from expenses.search import restore_search_after_migrate
+        post_migrate.connect(restore_search_after_migrate, sender=self)
\ No newline at end of file
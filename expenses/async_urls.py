@@ -0,0 +1,15 @@
+"""
+URLs of the async views (async_views.py), mounted under /async/ for ASGI
+deployments. Same names as the sync routes, prefixed with async_.
+"""
+from django.urls import path
+from . import async_views
+
+urlpatterns = [
+    path('summary/', async_views.expense_summary, name='async_expense_summary'),
+    path('chatbot/', async_views.chatbot_view, name='async_chatbot'),
+    path('api/expenses/summary/', async_views.api_summary, name='async_api_summary'),
+    path('api/expenses/monthly_stats/', async_views.api_monthly_stats, name='async_api_monthly_stats'),
+    path('api/expenses/dashboard/', async_views.api_dashboard, name='async_api_dashboard'),
+    path('live/', async_views.live_feed, name='async_live'),
+]
@@ -0,0 +1,240 @@
+"""
+Async versions of the chatbot, the summary page and the summary API, for
+ASGI deployments (see async_urls.py).
+
+They build the same querysets as the sync views and run them on the async
+ORM (aaggregate, async for). That is not concurrency within a request:
+Django runs every async ORM call through one thread-sensitive executor, so
+a request's queries still execute one after another, and they are awaited
+in turn. What changes is that between queries - and while the client or
+cache is being waited on - the request holds no thread, so one ASGI worker
+serves many dashboard loads at once. Under WSGI keep the sync views: Django
+would start an event loop per request for these.
+"""
+import json
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.decorators import login_required
+from django.db.models import Sum
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from django.shortcuts import render
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import quote_etag
+from django.views.decorators.http import require_GET
+
+from .api_views import (SummaryParamError, data_etag, job_status, monthly_stats_data, monthly_stats_period,
+    monthly_stats_queryset, summary_data, summary_days, summary_params, summary_query, summary_queryset,
+    wants_background)
+from . import jobs, live
+from .caching import acached, arequest_data_version
+from .chatbot_utils import aprocess_chat_query
+from .grouping import agroup_totals, bucket_days, expense_rows, with_expenses
+from .models import Expense, ExpenseDailyRollup
+from .money import from_cents
+
+
+async def _request_user(request):
+    # resolved once, on the async path; templates then reuse it
+    request.user = await request.auser()
+    return request.user
+
+
+# Templates may still query (base.html reads user.profile), so they render in a thread.
+arender = sync_to_async(render)
+
+
+@login_required
+async def chatbot_view(request):
+    user = await _request_user(request)
+    if request.method == "POST":
+        response = await aprocess_chat_query(user, request.POST.get("query"))
+        return JsonResponse({"response": response})
+    return await arender(request, "expenses/chatbot.html")
+
+
+@login_required
+async def expense_summary(request):
+    user = await _request_user(request)
+    filter_type = request.GET.get('filter', 'daily')
+    selected_category = request.GET.get('category', 'All')
+
+    # base querysets filtered by user and optionally category
+    base_qs = Expense.objects.filter(user=user)
+    rollup_qs = ExpenseDailyRollup.objects.filter(user=user)
+    if selected_category and selected_category != 'All':
+        base_qs = base_qs.filter(category=selected_category)
+        rollup_qs = rollup_qs.filter(category=selected_category)
+
+    async def compute():
+        totals = await rollup_qs.aaggregate(total=Sum('total_cents'))
+        return from_cents(totals['total']), await agroup_totals(rollup_qs, filter_type)
+
+    total_amount, buckets = await acached(
+        user.id, 'expense_summary',
+        (('filter', filter_type), ('category', selected_category)), compute)
+    report_job = None
+    if wants_background(request, bucket_days(buckets)):
+        rows, report_job = await sync_to_async(jobs.summary_page_rows)(
+            user, selected_category, await arequest_data_version(request, user))
+    else:
+        rows = [row async for row in expense_rows(base_qs)]
+    grouped_expenses = with_expenses(buckets, rows)
+
+    chart_labels = [g['range'] for g in buckets]
+    chart_data = [float(g['total'] or 0) for g in buckets]
+
+    return await arender(request, 'expenses/expense_summary.html', {
+        'grouped_expenses': grouped_expenses,
+        'total_amount': total_amount,
+        'filter_type': filter_type,
+        'categories': [c[0] for c in Expense.CATEGORY_CHOICES],
+        'selected_category': selected_category,
+        'chart_labels_json': json.dumps(chart_labels),
+        'chart_data_json': json.dumps(chart_data),
+        'live_updates': live.live_updates(request),
+        'report_job': report_job,
+    })
+
+
+async def _api_user(request):
+    """The session user, or None (answered with the API's 403)."""
+    user = await request.auser()
+    return user if user.is_authenticated else None
+
+
+def _forbidden():
+    return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=403)
+
+
+async def _accepted(request, user, kind, params=None):
+    """Queue a background job like the sync API does: 202 with its status."""
+    job = await sync_to_async(jobs.enqueue)(user, kind, params)
+    data = job_status(request, job)
+    return JsonResponse(data, status=202, headers={'Location': data['url']})
+
+
+async def _conditional_json(request, user, compute):
+    """
+    JSON of `await compute(version)`, or 304 Not Modified when If-None-Match
+    matches; the ETag is the one the sync API uses for the same URL.
+    """
+    version = await arequest_data_version(request, user)
+    etag = quote_etag(data_etag(request, user.id, version)) if version is not None else None
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = JsonResponse(await compute(version), safe=False)
+        if etag:
+            response.headers['ETag'] = etag
+    patch_vary_headers(response, ['Accept'])
+    return response
+
+
+@require_GET
+async def api_summary(request):
+    """GET /async/api/expenses/summary/: same parameters and output as the sync summary action."""
+    user = await _api_user(request)
+    if user is None:
+        return _forbidden()
+    try:
+        params = summary_params(request.GET)
+    except SummaryParamError as e:
+        return JsonResponse({'detail': str(e)}, status=400)
+    if wants_background(request, summary_days(params)):
+        return await _accepted(request, user, 'summary', summary_query(params))
+
+    async def compute():
+        return summary_data([row async for row in summary_queryset(user, **params)], **params)
+
+    return await _conditional_json(
+        request, user, lambda version: acached(user.id, 'summary', params.items(), compute, version=version))
+
+
+@require_GET
+async def api_monthly_stats(request):
+    """GET /async/api/expenses/monthly_stats/: same output as the sync monthly_stats action."""
+    user = await _api_user(request)
+    if user is None:
+        return _forbidden()
+    if wants_background(request):
+        return await _accepted(request, user, 'monthly_stats')
+    last_12_months = monthly_stats_period()
+
+    async def compute():
+        return monthly_stats_data([row async for row in monthly_stats_queryset(user, last_12_months)])
+
+    return await _conditional_json(
+        request, user,
+        lambda version: acached(user.id, 'monthly_stats', [('period', last_12_months)], compute, version=version))
+
+
+@require_GET
+async def api_dashboard(request):
+    """
+    GET /async/api/expenses/dashboard/: the summary and the 12-month
+    breakdown in one response (one round trip for the client; the two
+    queries still run one after the other). A summary the
+    sync API would run in the background answers 202 with that job instead.
+    """
+    user = await _api_user(request)
+    if user is None:
+        return _forbidden()
+    try:
+        params = summary_params(request.GET)
+    except SummaryParamError as e:
+        return JsonResponse({'detail': str(e)}, status=400)
+    if wants_background(request, summary_days(params)):
+        return await _accepted(request, user, 'summary', summary_query(params))
+    last_12_months = monthly_stats_period()
+
+    async def summary():
+        return summary_data([row async for row in summary_queryset(user, **params)], **params)
+
+    async def monthly():
+        return monthly_stats_data([row async for row in monthly_stats_queryset(user, last_12_months)])
+
+    async def compute(version):
+        return {
+            'summary': await acached(user.id, 'summary', params.items(), summary, version=version),
+            'monthly_stats': await acached(user.id, 'monthly_stats', [('period', last_12_months)], monthly,
+                                           version=version),
+        }
+
+    return await _conditional_json(request, user, compute)
+
+
+@require_GET
+async def live_feed(request):
+    """
+    GET /async/live/: Server-Sent Events stream of the user's totals.
+
+    Sends a `totals` event on connect and after every batch of changes:
+    {"total", "count", "average", "by_category": {category: {...}},
+     "changes": {category: {"total", "count"}}} (changes are deltas).
+    """
+    user = await _api_user(request)
+    if user is None:
+        return _forbidden()
+    if not isinstance(request, ASGIRequest):
+        # a WSGI worker would be tied up for as long as the page stays open
+        return JsonResponse({'detail': 'Live updates need an ASGI server.'}, status=501)
+    response = StreamingHttpResponse(_live_events(user.id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+async def _live_events(user_id, heartbeat=live.HEARTBEAT_SECONDS):
+    # subscribe first, so nothing committed after the first snapshot is missed
+    async with live.get_broker().subscribe(user_id) as subscription:
+        yield 'retry: 5000\n' + live.sse_message('totals', {**await live.atotals(user_id), 'changes': {}})
+        while True:
+            event = await subscription.get(heartbeat)
+            if event is None:
+                yield ': keepalive\n\n'
+                continue
+            # one snapshot for everything that arrived meanwhile (e.g. a bulk import)
+            events = [event]
+            while (event := await subscription.get(0)) is not None:
+                events.append(event)
+            yield live.sse_message('totals', {**await live.atotals(user_id), 'changes': live.merge_changes(events)})
@@ -0,0 +1,174 @@
+"""
+Bulk create / update / delete of expenses.
+
+A whole batch of operations is validated up front, rows that need a category
+are categorized in one pass, and everything is written with bulk_create /
+update_by_pk (bulk_sql.py) inside a single transaction. Nothing is written
+when any operation is invalid.
+"""
+import logging
+import time
+
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.serializers import as_serializer_error
+
+from . import caching, rollups
+from .ai_utils import predict_categories
+from .bulk_sql import update_by_pk
+from .keywords import keyword_category
+from .models import Expense
+from .money import to_cents
+from .serializers import ExpenseBulkRowSerializer
+
+logger = logging.getLogger(__name__)
+
+MAX_OPERATIONS = 10000
+OPERATIONS = ('create', 'update', 'delete')
+WRITE_FIELDS = ['title', 'amount', 'amount_cents', 'category', 'date', 'description', 'category_model_version',
+                'updated_at']
+BATCH_SIZE = 1000
+
+
+def prepare_expenses(expenses):
+    """
+    Apply what the Expense pre_save signals and expense_create would do,
+    for rows written without signals: default dates and batch categorization.
+    """
+    today = timezone.now().date()
+    uncategorized = [expense for expense in expenses if not expense.category]
+    if uncategorized:
+        predictions, version = predict_categories([
+            (expense.title or '') + ' ' + (expense.description or '') for expense in uncategorized
+        ], return_version=True)
+        for expense, category in zip(uncategorized, predictions):
+            expense.category = category
+            expense.category_model_version = version
+
+    for expense in expenses:
+        if not expense.date:
+            expense.date = today
+        if expense.category == 'Other':
+            expense.category = keyword_category(expense.title) or 'Other'
+
+
+def _parse_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def run_bulk(user, operations, context):
+    """
+    Validate and apply `operations` for `user`.
+
+    Returns (results, ok): one result dict per operation, in request order,
+    and whether the batch was written. When it was not, valid operations
+    are reported with status 'skipped'.
+    """
+    started = time.perf_counter()
+    results = [None] * len(operations)
+    ok = True
+
+    def fail(index, op, errors):
+        nonlocal ok
+        ok = False
+        results[index] = {'index': index, 'op': op, 'status': 'error', 'errors': errors}
+
+    create_rows = ExpenseBulkRowSerializer(context=context)
+    update_rows = ExpenseBulkRowSerializer(partial=True, context=context)
+
+    # Load every targeted expense with one query
+    target_ids = [
+        _parse_id(operation.get('id')) for operation in operations
+        if isinstance(operation, dict) and operation.get('op') in ('update', 'delete')
+    ]
+    existing = Expense.objects.filter(user=user).in_bulk([pk for pk in target_ids if pk is not None])
+
+    creates, updates, deletes = [], [], []
+    seen_ids = set()
+    for index, operation in enumerate(operations):
+        if not isinstance(operation, dict) or operation.get('op') not in OPERATIONS:
+            op = operation.get('op') if isinstance(operation, dict) else None
+            fail(index, op, {'op': [f"Expected one of: {', '.join(OPERATIONS)}."]})
+            continue
+        op = operation['op']
+        if op == 'create':
+            creates.append((index, operation.get('data') or {}))
+            continue
+
+        pk = _parse_id(operation.get('id'))
+        if pk not in existing:
+            fail(index, op, {'id': ['Expense not found.']})
+        elif pk in seen_ids:
+            fail(index, op, {'id': ['Expense appears more than once in this batch.']})
+        elif op == 'update':
+            updates.append((index, existing[pk], operation.get('data') or {}))
+        else:
+            deletes.append((index, existing[pk]))
+        seen_ids.add(pk)
+
+    # One serializer per kind validates every row: building one per row
+    # (or a many=True list) costs more than the validation itself
+    validated = []
+    for index, data in creates:
+        try:
+            validated.append((index, create_rows.run_validation(data)))
+        except ValidationError as exc:
+            fail(index, 'create', as_serializer_error(exc))
+
+    changed = []
+    for index, expense, data in updates:
+        try:
+            changed.append((index, expense, update_rows.run_validation(data)))
+        except ValidationError as exc:
+            fail(index, 'update', as_serializer_error(exc))
+
+    if not ok:
+        # valid operations were not applied either; say so rather than leave a gap
+        for index, operation in enumerate(operations):
+            if results[index] is None:
+                results[index] = {'index': index, 'op': operation['op'], 'status': 'skipped',
+                                  'reason': 'batch failed'}
+        return results, False
+
+    new_expenses = [(index, Expense(user=user, **data)) for index, data in validated]
+    with transaction.atomic(), rollups.deferred() as deltas, caching.deferred() as stale_users:
+        # bulk_create/update_by_pk send no signals
+        stale_users.add(user.id)
+        written_at = timezone.now()
+        for _, expense, data in changed:
+            rollups.add_expense(deltas, expense, sign=-1)
+            # update_by_pk skips auto_now
+            expense.updated_at = written_at
+            for field, value in data.items():
+                setattr(expense, field, value)
+            expense.amount_cents = to_cents(expense.amount)
+            if data.get('category'):
+                expense.category_model_version = None
+
+        written = [expense for _, expense in new_expenses] + [expense for _, expense, _ in changed]
+        prepare_expenses(written)
+        Expense.objects.bulk_create([expense for _, expense in new_expenses], batch_size=BATCH_SIZE)
+        update_by_pk(Expense, WRITE_FIELDS, {
+            expense.pk: [getattr(expense, field) for field in WRITE_FIELDS]
+            for _, expense, _ in changed
+        }, batch_size=BATCH_SIZE)
+        for expense in written:
+            rollups.add_expense(deltas, expense)
+
+        # post_delete signals add their rollup deltas to the deferred batch
+        Expense.objects.filter(pk__in=[expense.pk for _, expense in deletes]).delete()
+
+    for index, expense in new_expenses:
+        results[index] = {'index': index, 'op': 'create', 'status': 'created', 'id': expense.pk}
+    for index, expense, _ in changed:
+        results[index] = {'index': index, 'op': 'update', 'status': 'updated', 'id': expense.pk}
+    for index, expense in deletes:
+        results[index] = {'index': index, 'op': 'delete', 'status': 'deleted', 'id': expense.pk}
+
+    elapsed = time.perf_counter() - started
+    logger.info(f"📦 Bulk write for {user.username}: {len(operations)} operation(s) in {elapsed:.3f}s")
+    return results, True
@@ -0,0 +1,60 @@
+"""
+Batched UPDATEs by primary key, for the bulk endpoint and the rollups.
+
+QuerySet.bulk_update builds Case(When(pk=...)) expressions and resolves one
+filter per row and field, which costs far more than the query itself once
+batches reach thousands of rows. update_by_pk writes the same statement
+
+    UPDATE table SET col = CASE pk WHEN %s THEN %s ... END, ... WHERE pk IN (...)
+
+directly, with values prepared as the model fields would save them. It sends
+no signals and applies no auto_now, like bulk_update.
+"""
+from django.db import connections, router
+
+BATCH_SIZE = 1000
+
+
+def update_by_pk(model, fields, rows, increment=False, batch_size=BATCH_SIZE, using=None):
+    """
+    Update `fields` (names) of `model` from `rows`, {pk: [value per field]}.
+
+    With increment=True each value is added to the stored one instead
+    (col = col + CASE ...), for counters updated concurrently.
+    Returns the number of rows updated.
+    """
+    if not rows:
+        return 0
+    using = using or router.db_for_write(model)
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    fields = [model._meta.get_field(name) for name in fields]
+    pk_column = quote(model._meta.pk.column)
+    max_params = connection.features.max_query_params
+    if max_params:
+        # two parameters per row and field, one per row for WHERE pk IN
+        batch_size = min(batch_size, max_params // (2 * len(fields) + 1))
+
+    items = list(rows.items())
+    updated = 0
+    with connection.cursor() as cursor:
+        for start in range(0, len(items), batch_size):
+            batch = items[start:start + batch_size]
+            when = ' '.join(['WHEN %s THEN %s'] * len(batch))
+            assignments, params = [], []
+            for i, field in enumerate(fields):
+                case = f'CASE {pk_column} {when} END'
+                if connection.features.requires_casted_case_in_updates:
+                    case = f'CAST({case} AS {field.db_type(connection)})'
+                column = quote(field.column)
+                assignments.append(f'{column} = {column} + {case}' if increment else f'{column} = {case}')
+                for pk, values in batch:
+                    params += [pk, field.get_db_prep_save(values[i], connection)]
+            params += [pk for pk, _ in batch]
+            cursor.execute(
+                f'UPDATE {quote(model._meta.db_table)} SET {", ".join(assignments)} '
+                f'WHERE {pk_column} IN ({", ".join(["%s"] * len(batch))})',
+                params,
+            )
+            updated += cursor.rowcount
+    return updated
@@ -0,0 +1,172 @@
+"""
+Per-user cache for dashboard and summary numbers.
+
+Entries live in Django's cache framework (the EXPENSE_CACHE_ALIAS cache; the
+default LocMemCache evicts least recently used entries past MAX_ENTRIES and
+expires them after EXPENSE_CACHE_TIMEOUT seconds).
+
+Every key contains the user's data version: a random token stored in
+ExpenseDataVersion and replaced in the same transaction as any write to the
+user's expenses (signals for single saves/deletes, explicit calls in the bulk
+paths). Invalidation is therefore a single UPDATE, shared by every worker
+process, and an outdated entry is never read again - it just ages out.
+
+The a-prefixed functions are the same lookups for async views.
+"""
+import hashlib
+import secrets
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .models import ExpenseDataVersion
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+_local = threading.local()
+
+
+def _cache():
+    return caches[getattr(settings, 'EXPENSE_CACHE_ALIAS', 'default')]
+
+
+def new_version():
+    return secrets.randbits(62)
+
+
+def data_version(user_id):
+    """The user's current data version, or None if they don't have one yet."""
+    return ExpenseDataVersion.objects.filter(user_id=user_id).values_list('version', flat=True).first()
+
+
+async def adata_version(user_id):
+    return await ExpenseDataVersion.objects.filter(user_id=user_id).values_list('version', flat=True).afirst()
+
+
+def request_data_version(request):
+    """
+    The requesting user's data version, looked up once per request and
+    shared by the conditional GET check and cached().
+    """
+    if not hasattr(request, '_expense_data_version'):
+        request._expense_data_version = data_version(request.user.id)
+    return request._expense_data_version
+
+
+async def arequest_data_version(request, user):
+    if not hasattr(request, '_expense_data_version'):
+        request._expense_data_version = await adata_version(user.id)
+    return request._expense_data_version
+
+
+def bump_data_version(user_ids=None):
+    """Invalidate everything cached for these users (everyone when None)."""
+    if user_ids is None:
+        ExpenseDataVersion.objects.update(version=new_version())
+        return
+    ExpenseDataVersion.objects.bulk_create(
+        [ExpenseDataVersion(user_id=user_id, version=new_version()) for user_id in set(user_ids)],
+        update_conflicts=True, unique_fields=['user'], update_fields=['version'],
+    )
+
+
+@contextmanager
+def deferred():
+    """
+    Collect the users invalidated inside the block and bump each of them once
+    on exit, instead of once per written row. Nested blocks share the outer set.
+    """
+    if getattr(_local, 'user_ids', None) is not None:
+        yield _local.user_ids
+        return
+    _local.user_ids = set()
+    try:
+        yield _local.user_ids
+        if _local.user_ids:
+            bump_data_version(_local.user_ids)
+    finally:
+        _local.user_ids = None
+
+
+def invalidate(user_ids):
+    """Bump these users' data versions now, or at the end of the enclosing deferred() block."""
+    batch = getattr(_local, 'user_ids', None)
+    if batch is None or user_ids is None:
+        bump_data_version(user_ids)
+    else:
+        batch.update(user_ids)
+
+
+def cache_key(user_id, version, namespace, params=()):
+    digest = hashlib.md5(repr(sorted(params)).encode()).hexdigest()
+    return f"expenses:{namespace}:{user_id}:{version}:{digest}"
+
+
+def cached(user_id, namespace, params, compute, version=None):
+    """
+    Return compute() for this user and parameters, from the cache when the
+    user's data hasn't changed since it was stored.
+
+    `params` is an iterable of (name, value) pairs identifying the result.
+    Pass `version` when the caller already looked it up.
+    """
+    if version is None:
+        version = data_version(user_id)
+    if version is None:
+        _count(namespace, 'misses')
+        return compute()
+    key = cache_key(user_id, version, namespace, params)
+    cache = _cache()
+    value = cache.get(key)
+    if value is not None:
+        _count(namespace, 'hits')
+        return value
+    _count(namespace, 'misses')
+    value = compute()
+    cache.set(key, value, getattr(settings, 'EXPENSE_CACHE_TIMEOUT', 300))
+    return value
+
+
+async def acached(user_id, namespace, params, compute, version=None):
+    """cached() for async views: `compute` is a coroutine function."""
+    if version is None:
+        version = await adata_version(user_id)
+    if version is None:
+        _count(namespace, 'misses')
+        return await compute()
+    key = cache_key(user_id, version, namespace, params)
+    cache = _cache()
+    value = await cache.aget(key)
+    if value is not None:
+        _count(namespace, 'hits')
+        return value
+    _count(namespace, 'misses')
+    value = await compute()
+    await cache.aset(key, value, getattr(settings, 'EXPENSE_CACHE_TIMEOUT', 300))
+    return value
+
+
+def _count(namespace, outcome):
+    with _stats_lock:
+        _stats[(namespace, outcome)] += 1
+
+
+def cache_stats():
+    """Hit/miss counters of this process, per namespace."""
+    with _stats_lock:
+        items = list(_stats.items())
+    stats = {}
+    for (namespace, outcome), value in items:
+        stats.setdefault(namespace, {'hits': 0, 'misses': 0})[outcome] = value
+    for counters in stats.values():
+        lookups = counters['hits'] + counters['misses']
+        counters['hit_rate'] = round(counters['hits'] / lookups, 4) if lookups else None
+    return stats
+
+
+def reset_cache_stats():
+    with _stats_lock:
+        _stats.clear()
@@ -0,0 +1,173 @@
+"""
+Grammar of the chatbot's questions.
+
+parse() reads a question into a ChatQuery (intent, periods, categories,
+amount bounds, row limit) with a few regular expressions compiled once at
+import. It runs no queries: chatbot_utils turns a ChatQuery into exactly
+one database query, however many filters the question combines.
+
+Understood anywhere in a question, case-insensitively:
+
+- dates: today, yesterday; this/last week, month, quarter, year; last N
+  days/weeks (rolling) and last N months (calendar months, this one
+  included); named months ("in march", "march 2025": the latest one not in
+  the future unless a year is given); "from 2025-01-01 to 2025-01-31",
+  "since 2025-01-01", "on 2025-01-05"
+- categories: the Expense category names
+- amounts: over/above/more than/greater than, at least, under/below/less
+  than, at most, followed by a number (optionally ₹, $, rs or inr)
+- intents: total, average, top N ("top 3", "biggest"; "top categories"
+  ranks categories), trend (per calendar month), compare (two periods or
+  two categories) and by-category breakdown. A question naming only dates,
+  categories or amounts asks for the total.
+
+Impossible dates ("2025-13-01") are ignored; periods reaching past the
+calendar ("last 999999 months") are kept in ChatQuery.unreadable_periods,
+for the chatbot to say it couldn't understand them.
+"""
+import re
+from datetime import date
+from decimal import Decimal
+from typing import NamedTuple
+
+from . import periods
+from .models import Expense
+from .money import to_cents
+
+MONTHS = {
+    'january': 1, 'jan': 1, 'february': 2, 'feb': 2, 'march': 3, 'mar': 3, 'april': 4, 'apr': 4,
+    'may': 5, 'june': 6, 'jun': 6, 'july': 7, 'jul': 7, 'august': 8, 'aug': 8,
+    'september': 9, 'sept': 9, 'sep': 9, 'october': 10, 'oct': 10, 'november': 11, 'nov': 11,
+    'december': 12, 'dec': 12,
+}
+RELATIVE_UNITS = {
+    'week': periods.iso_week,
+    'month': periods.month,
+    'quarter': periods.quarter,
+    'year': periods.year,
+}
+AMOUNT_LOOKUPS = {
+    'over': 'gt', 'above': 'gt', 'more than': 'gt', 'greater than': 'gt', 'at least': 'gte',
+    'under': 'lt', 'below': 'lt', 'less than': 'lt', 'at most': 'lte',
+}
+CATEGORIES = {value.lower(): value for value, _ in Expense.CATEGORY_CHOICES}
+INTENTS = ('compare', 'trend', 'top', 'average', 'breakdown', 'total')  # by precedence
+DEFAULT_LIMIT = 5
+
+
+def _alternation(words):
+    # longest first, so "sept" wins over "sep"
+    return '|'.join(re.escape(word) for word in sorted(words, key=len, reverse=True))
+
+
+_ISO = r'\d{4}-\d{2}-\d{2}'
+_MONTH = _alternation(MONTHS)
+
+PERIOD_PATTERN = re.compile(rf"""
+    \b(?:
+        (?P<day>today|yesterday)
+      | (?P<relative>this|last|previous|past)\s+(?P<unit>week|month|quarter|year)
+      | (?:last|past|previous)\s+(?P<count>\d+)\s+(?P<units>day|week|month)s?
+      | (?:from|between)\s+(?P<first>{_ISO})\s+(?:to|and|until)\s+(?P<last>{_ISO})
+      | since\s+(?P<since>{_ISO})
+      | (?P<on>{_ISO})
+      | (?:in|during|for)\s+(?P<month>{_MONTH})(?:\s+(?P<month_year>\d{{4}}))?
+      | (?P<dated_month>{_MONTH})\s+(?P<dated_year>\d{{4}})
+    )\b""", re.VERBOSE)
+CATEGORY_PATTERN = re.compile(rf"\b({_alternation(CATEGORIES)})\b")
+AMOUNT_PATTERN = re.compile(
+    rf"\b(?P<op>{_alternation(AMOUNT_LOOKUPS)})\s*(?:₹|\$|rs\.?|inr)?\s*(?P<value>\d[\d,]*(?:\.\d+)?)")
+TOP_PATTERN = re.compile(r"\b(?:top|biggest|largest|highest|most expensive)\b(?:\s+(?P<limit>\d+))?")
+INTENT_PATTERN = re.compile(r"""
+    \b(?:
+        (?P<compare>compare|versus|vs)
+      | (?P<trend>trends?|over\ time|per\ month|each\ month|month\ by\ month)
+      | (?P<top>top|biggest|largest|highest|most\ expensive)
+      | (?P<average>average|avg|mean)
+      | (?P<breakdown>categories|category|breakdown)
+      | (?P<total>total|how\ much|spent|spend|spending|sum)
+    )\b""", re.VERBOSE)
+
+
+class ChatQuery(NamedTuple):
+    intent: str                  # one of INTENTS, or None when nothing was understood
+    periods: tuple = ()          # ((label, Period), ...) in the order mentioned
+    categories: tuple = ()       # Expense category values
+    amounts: tuple = ()          # ((lookup, cents), ...), e.g. ('gt', 50000)
+    limit: int = DEFAULT_LIMIT   # rows for 'top'
+    by_category: bool = False    # 'top' ranks categories rather than expenses
+    unreadable_periods: tuple = ()  # labels of periods before year 1 or after 9999
+
+
+def _period(match, today):
+    """
+    (label, Period) for a PERIOD_PATTERN match, None for an impossible date,
+    or (label, None) for a period outside the calendar.
+    """
+    groups = match.groupdict()
+    label = match.group(0).strip()
+    try:
+        dates = {name: date.fromisoformat(groups[name]) for name in ('first', 'last', 'since', 'on') if groups[name]}
+    except ValueError:
+        return None
+    try:
+        if groups['day']:
+            return label, periods.day(today, offset=-1 if groups['day'] == 'yesterday' else 0)
+        if groups['relative']:
+            offset = 0 if groups['relative'] == 'this' else -1
+            return label, RELATIVE_UNITS[groups['unit']](today, offset=offset)
+        if groups['count']:
+            count = int(groups['count'])
+            if count < 1:
+                return None
+            if groups['units'] == 'month':
+                return label, periods.span(periods.month(today, offset=1 - count), periods.month(today))
+            days = count * (7 if groups['units'] == 'week' else 1)
+            return label, periods.rolling_days(days, today)
+        if groups['first']:
+            first, last = dates['first'], dates['last']
+            return (label, periods.between(first, last)) if first <= last else None
+        if groups['since']:
+            return label, periods.between(dates['since'], today)
+        if groups['on']:
+            return label, periods.day(dates['on'])
+        name, year = groups['month'] or groups['dated_month'], groups['month_year'] or groups['dated_year']
+        number = MONTHS[name]
+        if year:
+            return label, periods.month(date(int(year), number, 1))
+        return label, periods.month(date(today.year - (number > today.month), number, 1))
+    except (ValueError, OverflowError):
+        # the period would start before year 1 or end after year 9999
+        return label, None
+
+
+def parse(question, today=None):
+    """Read a question into a ChatQuery."""
+    text = str(question or '').lower()
+    today = today or periods.today()
+
+    parsed = tuple(filter(None, (_period(match, today) for match in PERIOD_PATTERN.finditer(text))))
+    found_periods = tuple((label, period) for label, period in parsed if period is not None)
+    unreadable_periods = tuple(label for label, period in parsed if period is None)
+    categories = tuple(dict.fromkeys(CATEGORIES[name] for name in CATEGORY_PATTERN.findall(text)))
+    amounts = tuple(
+        (AMOUNT_LOOKUPS[match.group('op')], to_cents(Decimal(match.group('value').replace(',', ''))))
+        for match in AMOUNT_PATTERN.finditer(text)
+    )
+
+    mentioned = {name for match in INTENT_PATTERN.finditer(text) for name, value in match.groupdict().items() if value}
+    intent = next((name for name in INTENTS if name in mentioned), None)
+    if intent is None and (found_periods or categories or amounts):
+        intent = 'total'
+
+    limit, by_category = DEFAULT_LIMIT, False
+    if intent == 'top':
+        top = TOP_PATTERN.search(text)
+        if top and top.group('limit'):
+            limit = max(1, int(top.group('limit')))
+        by_category = 'categor' in text
+    elif intent == 'compare' and len(found_periods) < 2 and len(categories) < 2:
+        # nothing to put side by side: compare all categories
+        intent = 'breakdown'
+
+    return ChatQuery(intent, found_periods, categories, amounts, limit, by_category, unreadable_periods)
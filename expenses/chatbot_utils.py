@@ -1,50 +1,176 @@
-import re
-from datetime import date, timedelta
-from django.db.models import Sum
-from .models import Expense
+"""
+Answers chatbot questions with one database query each.
 
-def process_chat_query(user, query: str):
-    query = query.lower()
-
-    today = date.today()
-    expenses = Expense.objects.filter(user=user)
-    
-    # Date filters
-    if "today" in query:
-        expenses = expenses.filter(date=today)
-    elif "yesterday" in query:
-        expenses = expenses.filter(date=today - timedelta(days=1))
-    elif "this month" in query:
-        expenses = expenses.filter(date__month=today.month, date__year=today.year)
-    elif "last month" in query:
-        prev_month = today.month - 1 or 12
-        prev_year = today.year if today.month > 1 else today.year - 1
-        expenses = expenses.filter(date__month=prev_month, date__year=prev_year)
-
-    # Category filters
-    category_match = re.search(r"(food|travel|entertainment|utilities|sharing|other)", query)
-    if category_match:
-        cat = category_match.group(1).capitalize()
-        expenses = expenses.filter(category=cat)
-
-    # Intent detection
-    if "total" in query or "how much" in query:
-        total = expenses.aggregate(Sum('amount'))['amount__sum'] or 0
-        return f"Total expenses: ₹{total:.2f}"
-    elif "trend" in query:
-        monthly = (Expense.objects.filter(user=user)
-                    .values('date__month')
-                    .annotate(total=Sum('amount'))
-                    .order_by('date__month'))
-        trend_text = " → ".join([f"{m['date__month']}: ₹{m['total']}" for m in monthly])
-        return f"Monthly Trend: {trend_text}"
-    elif "category" in query or "categories" in query:
-        by_cat = (expenses.values('category')
-                    .annotate(total=Sum('amount'))
-                    .order_by('-total'))
-        lines = [f"{x['category']}: ₹{x['total']}" for x in by_cat]
-        return r"<br>".join(lines)
+chat_grammar.parse() reads the question; plan_chat_query() turns it into a
+single aggregate or grouped query over the daily rollups - or over the
+expenses themselves when the question filters or lists individual amounts.
+
+Answers are cached per user and data version (see caching.py) under
+chat_cache_params(): what the question means rather than how it was worded,
+so "total food this month" and "how much did I spend on food this month?"
+share one entry, and any write to the user's expenses retires it.
+"""
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncMonth
+
+from . import chat_grammar, periods
+from .caching import acached, cached
+from .models import Expense, ExpenseDailyRollup
+from .money import from_cents
+
+HELP_TEXT = "I can help with queries like 'Show food expenses this month' or 'Total travel expenses today'."
+TREND_MONTHS = 12  # trend window when the question names no dates
+
+
+class _Source:
+    """A table to aggregate: its queryset and how to sum cents and count expenses."""
+
+    def __init__(self, model, cents_field, count):
+        self.model = model
+        self.cents_field = cents_field
+        self.count = count
+
+    def cents(self, **kwargs):
+        return Sum(self.cents_field, **kwargs)
+
+
+ROLLUPS = _Source(ExpenseDailyRollup, 'total_cents', lambda: Sum('count'))
+EXPENSES = _Source(Expense, 'amount_cents', lambda: Count('id'))
+
+
+def _span(chat, today=None):
+    """The date range a ChatQuery reads: all the periods it mentions, as one range."""
+    mentioned = [period for _, period in chat.periods]
+    if mentioned:
+        return periods.Period(min(p.start for p in mentioned), max(p.end for p in mentioned))
+    if chat.intent == 'trend':
+        return periods.span(periods.month(today, offset=1 - TREND_MONTHS), periods.month(today))
+    return None
+
+
+def chat_cache_params(chat, today=None):
+    """
+    (name, value) pairs identifying a ChatQuery's answer. Relative dates are
+    already resolved, so "this month" gets a new entry when the month turns.
+    """
+    params = [('intent', chat.intent), ('span', _span(chat, today)), ('amounts', tuple(sorted(chat.amounts)))]
+    if chat.intent == 'compare':
+        # the answer lists them in the order asked, periods under their own words
+        params += [('categories', chat.categories), ('periods', chat.periods if len(chat.periods) >= 2 else ())]
     else:
-        # Default fallback
-        return "I can help with queries like 'Show food expenses this month' or 'Total travel expenses today'."
+        params.append(('categories', tuple(sorted(chat.categories))))
+    if chat.intent == 'top':
+        params += [('limit', chat.limit), ('by_category', chat.by_category)]
+    return params
+
+
+def plan_chat_query(user, chat, today=None):
+    """
+    Return (queryset, aggregates) answering a ChatQuery: the answer is
+    queryset.aggregate(**aggregates) when aggregates is a dict, otherwise the
+    queryset's rows.
+    """
+    # rollups hold one row per day and category; amounts need the expenses
+    listing = chat.intent == 'top' and not chat.by_category
+    source = EXPENSES if chat.amounts or listing else ROLLUPS
+    qs = source.model.objects.filter(user=user)
+    if chat.categories:
+        qs = qs.filter(category__in=chat.categories)
+    for lookup, cents in chat.amounts:
+        qs = qs.filter(**{f'amount_cents__{lookup}': cents})
+
+    span = _span(chat, today)
+    if span:
+        # all mentioned dates, as one index range scan
+        qs = qs.filter(**span.filter_kwargs())
+    compared = [period for _, period in chat.periods]
+
+    if chat.intent in ('total', 'average'):
+        return qs, {'cents': source.cents(), 'count': source.count()}
+    if chat.intent == 'compare' and len(compared) >= 2:
+        return qs, {f'period_{i}': source.cents(filter=Q(**period.filter_kwargs()))
+                    for i, period in enumerate(compared)}
+    if chat.intent == 'trend':
+        return (qs.annotate(month=TruncMonth('date')).values('month')
+                .annotate(cents=source.cents()).order_by('month')), None
+    if listing:
+        return qs.order_by('-amount_cents', '-date', '-id').values('title', 'date', 'amount')[:chat.limit], None
+
+    # breakdown, compare categories and top categories: one grouped query
+    grouped = qs.values('category').annotate(cents=source.cents(), count=source.count()).order_by('-cents', 'category')
+    if chat.intent == 'top':
+        grouped = grouped[:chat.limit]
+    return grouped, None
+
+
+def _money(cents):
+    return f"₹{from_cents(cents)}"
+
+
+def format_chat_answer(chat, result):
+    """Answer text for a ChatQuery from its aggregate (a dict) or rows."""
+    if chat.intent is None:
+        return HELP_TEXT
+    if chat.intent == 'total':
+        return f"Total expenses: ₹{from_cents(result['cents']):.2f}"
+    if chat.intent == 'average':
+        if not result['count']:
+            return "No expenses found."
+        average = from_cents(round(result['cents'] / result['count']))
+        return f"Average expense: ₹{average} over {result['count']} expense(s)"
+    if chat.intent == 'compare' and isinstance(result, dict):
+        parts = [f"{label.capitalize()}: {_money(result[f'period_{i}'])}" for i, (label, _) in enumerate(chat.periods)]
+        return " vs ".join(parts)
+    if chat.intent == 'trend':
+        if not result:
+            return "No expenses found."
+        trend_text = " → ".join(f"{row['month']:%b %Y}: {_money(row['cents'])}" for row in result)
+        return f"Monthly Trend: {trend_text}"
+    if chat.intent == 'top' and not chat.by_category:
+        if not result:
+            return "No expenses found."
+        lines = [f"{row['title']} ({row['date']:%d %b %Y}): ₹{row['amount']}" for row in result]
+        return r"<br>".join([f"Top {len(lines)} expense(s):", *lines])
+
+    totals = {row['category']: row['cents'] for row in result}
+    if chat.intent == 'compare':
+        return " vs ".join(f"{category}: {_money(totals.get(category, 0))}" for category in chat.categories)
+    if not totals:
+        return "No expenses found."
+    return r"<br>".join(f"{category}: {_money(cents)}" for category, cents in totals.items())
+
+
+def answer_chat_query(user, chat, today=None):
+    """The answer to a ChatQuery, from one database query."""
+    qs, aggregates = plan_chat_query(user, chat, today)
+    return format_chat_answer(chat, qs.aggregate(**aggregates) if aggregates else list(qs))
+
+
+async def aanswer_chat_query(user, chat, today=None):
+    """answer_chat_query() on the async ORM."""
+    qs, aggregates = plan_chat_query(user, chat, today)
+    return format_chat_answer(chat, await qs.aaggregate(**aggregates) if aggregates else [row async for row in qs])
+
+
+def _unanswerable(chat):
+    """The reply to a ChatQuery that needs no query, or None."""
+    if chat.unreadable_periods:
+        return f"I couldn't understand that period: {chat.unreadable_periods[0]}."
+    if chat.intent is None:
+        return HELP_TEXT
+    return None
+
+
+def process_chat_query(user, query: str):
+    chat = chat_grammar.parse(query)
+    if reply := _unanswerable(chat):
+        return reply
+    return cached(user.id, 'chat', chat_cache_params(chat), lambda: answer_chat_query(user, chat))
+
 
+async def aprocess_chat_query(user, query: str):
+    """process_chat_query() for async views."""
+    chat = chat_grammar.parse(query)
+    if reply := _unanswerable(chat):
+        return reply
+    return await acached(user.id, 'chat', chat_cache_params(chat), lambda: aanswer_chat_query(user, chat))
@@ -0,0 +1,111 @@
+"""
+Versioned registry of expense classifier artifacts.
+
+    <EXPENSE_CLASSIFIER_REGISTRY>/
+        CURRENT          name of the active version (swapped atomically)
+        v1/model.pkl     joblib dump of (vectorizer, model)
+        v1/meta.json     metadata recorded at registration
+
+Workers notice a new version by stat()ing CURRENT (see ai_utils.get_active_model),
+so publishing a model never requires a restart.
+"""
+import json
+import os
+import re
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.utils import timezone
+
+ARTIFACT_NAME = 'model.pkl'
+METADATA_NAME = 'meta.json'
+POINTER_NAME = 'CURRENT'
+VERSION_PATTERN = re.compile(r'^v(\d+)$')
+
+
+class RegistryError(Exception):
+    pass
+
+
+def _atomic_write(path, content):
+    """Write a small text file so readers only ever see the old or the new content."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    with os.fdopen(fd, 'w') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+class ClassifierRegistry:
+    def __init__(self, root):
+        self.root = str(root)
+
+    def versions(self):
+        """Registered versions, oldest first."""
+        if not os.path.isdir(self.root):
+            return []
+        found = [name for name in os.listdir(self.root) if VERSION_PATTERN.match(name)]
+        return sorted(found, key=lambda name: int(VERSION_PATTERN.match(name).group(1)))
+
+    def artifact_path(self, version):
+        return os.path.join(self.root, version, ARTIFACT_NAME)
+
+    def metadata(self, version):
+        path = os.path.join(self.root, version, METADATA_NAME)
+        if not os.path.exists(path):
+            raise RegistryError(f"Unknown classifier version: {version}")
+        with open(path) as f:
+            return json.load(f)
+
+    def active_version(self):
+        try:
+            with open(os.path.join(self.root, POINTER_NAME)) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def pointer_stamp(self):
+        """
+        Cheap change marker for the active version (None if nothing is active).
+        CURRENT is replaced, never rewritten, so its inode changes on every activation.
+        """
+        try:
+            stat = os.stat(os.path.join(self.root, POINTER_NAME))
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns)
+
+    def register(self, artifact=None, source_path=None, metadata=None, activate=True):
+        """
+        Store a new version from an in-memory (vectorizer, model) pair or an
+        existing artifact file and return its name.
+        """
+        import joblib
+
+        os.makedirs(self.root, exist_ok=True)
+        existing = self.versions()
+        number = int(VERSION_PATTERN.match(existing[-1]).group(1)) + 1 if existing else 1
+        version = f"v{number}"
+        staging = tempfile.mkdtemp(dir=self.root, prefix='.staging-')
+        if source_path is not None:
+            shutil.copyfile(source_path, os.path.join(staging, ARTIFACT_NAME))
+        else:
+            joblib.dump(artifact, os.path.join(staging, ARTIFACT_NAME))
+        meta = dict(metadata or {}, version=version, created_at=timezone.now().isoformat())
+        with open(os.path.join(staging, METADATA_NAME), 'w') as f:
+            json.dump(meta, f, indent=2, default=str)
+        # the version directory appears complete or not at all
+        os.rename(staging, os.path.join(self.root, version))
+
+        if activate:
+            self.activate(version)
+        return version
+
+    def activate(self, version):
+        if not os.path.exists(self.artifact_path(version)):
+            raise RegistryError(f"Unknown classifier version: {version}")
+        _atomic_write(os.path.join(self.root, POINTER_NAME), version + '\n')
+
+
+def get_registry():
+    return ClassifierRegistry(settings.EXPENSE_CLASSIFIER_REGISTRY)
@@ -0,0 +1,75 @@
+"""
+Columnar ("struct of arrays") encoding of expense rows.
+
+?layout=columnar turns a list of row objects into one array per column:
+
+    {"id": [3, 2], "date": ["2026-01-02", "2026-01-01"], "amount": ["4.50", "12.00"], ...}
+
+so key names are sent once instead of once per row. Low-cardinality string
+columns can also be dictionary encoded (?dictionary=category), sending each
+distinct value once plus an integer index per row:
+
+    {"category": {"dictionary": ["Food", "Travel"], "indices": [0, 1, 0]}}
+"""
+from itertools import islice
+
+LAYOUT_PARAM = 'layout'
+DICTIONARY_PARAM = 'dictionary'
+LAYOUTS = ('rows', 'columnar')
+DICTIONARY_FIELDS = ('category',)
+
+
+class LayoutError(ValueError):
+    """Bad ?layout= or ?dictionary= value."""
+
+
+def requested_layout(request):
+    """
+    Return (columnar, dictionary_fields) from the query string, raising
+    LayoutError for values we don't understand.
+    """
+    layout = request.query_params.get(LAYOUT_PARAM) or 'rows'
+    if layout not in LAYOUTS:
+        raise LayoutError(f"layout accepts: {', '.join(LAYOUTS)}.")
+    param = request.query_params.get(DICTIONARY_PARAM)
+    names = [name.strip() for name in param.split(',') if name.strip()] if param else []
+    if not set(names) <= set(DICTIONARY_FIELDS):
+        raise LayoutError(f"dictionary accepts: {', '.join(DICTIONARY_FIELDS)}.")
+    if names and layout != 'columnar':
+        raise LayoutError("dictionary requires layout=columnar.")
+    return layout == 'columnar', tuple(names)
+
+
+def dictionary_encode(values):
+    """Distinct values in first-seen order, and each value's index into them."""
+    positions = {}
+    indices = [positions.setdefault(value, len(positions)) for value in values]
+    return {'dictionary': list(positions), 'indices': indices}
+
+
+def to_columns(columns, rows, dictionary=()):
+    """
+    Transpose value tuples into {name: [values]}.
+
+    `columns` is a list of (name, convert) pairs matching the tuple positions,
+    where convert is applied to non-null values (None means use as is). Extra
+    trailing values in each row are ignored.
+    """
+    rows = rows if isinstance(rows, (list, tuple)) else list(rows)
+    transposed = list(zip(*rows)) if rows else [()] * len(columns)
+    data = {}
+    for (name, convert), values in zip(columns, transposed):
+        if convert is not None:
+            values = [value if value is None else convert(value) for value in values]
+        data[name] = dictionary_encode(values) if name in dictionary else list(values)
+    return data
+
+
+def batched_columns(columns, rows, batch_size, dictionary=()):
+    """Yield to_columns() for consecutive batches of an iterable of rows."""
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+        yield to_columns(columns, batch, dictionary)
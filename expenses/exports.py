@@ -0,0 +1,61 @@
+"""
+Streaming export of expenses as CSV or NDJSON (row objects, or columnar
+batches of CHUNK_SIZE rows with ?layout=columnar).
+
+Rows are read through a server-side cursor (QuerySet.iterator) and encoded
+one at a time, so memory stays flat regardless of how many rows a user has
+and the first bytes go out as soon as the first chunk is fetched.
+"""
+import csv
+import json
+from datetime import date
+
+from .columnar import batched_columns
+
+EXPORT_FIELDS = ['id', 'date', 'title', 'amount', 'category', 'description']
+# (name, convert) per EXPORT_FIELDS column, encoded like stream_ndjson does
+EXPORT_COLUMNS = [('id', None), ('date', date.isoformat), ('title', None), ('amount', str),
+                  ('category', None), ('description', None)]
+CHUNK_SIZE = 2000
+
+
+class Echo:
+    """File-like object whose write() just returns the value, for csv.writer."""
+    def write(self, value):
+        return value
+
+
+def export_rows(queryset, chunk_size=CHUNK_SIZE):
+    """Yield value tuples for EXPORT_FIELDS from a server-side cursor."""
+    return queryset.values_list(*EXPORT_FIELDS).iterator(chunk_size=chunk_size)
+
+
+def stream_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def stream_ndjson(rows):
+    for pk, date, title, amount, category, description in rows:
+        yield json.dumps({
+            'id': pk,
+            'date': date.isoformat(),
+            'title': title,
+            'amount': str(amount),
+            'category': category,
+            'description': description,
+        }) + '\n'
+
+
+def stream_ndjson_columnar(rows, dictionary=(), batch_size=CHUNK_SIZE):
+    """One {"id": [...], "date": [...], ...} object per line, per batch of rows."""
+    for columns in batched_columns(EXPORT_COLUMNS, rows, batch_size, dictionary):
+        yield json.dumps(columns) + '\n'
+
+
+STREAMERS = {
+    'csv': ('text/csv', stream_csv),
+    'ndjson': ('application/x-ndjson', stream_ndjson),
+}
@@ -0,0 +1,132 @@
+"""
+Single-pass grouping engine for the expense summary.
+
+Reads a user's daily rollups once, ordered by date, and streams them into
+day/week/month/year buckets with running totals, so the number of queries
+stays constant no matter how many buckets the summary spans. The buckets
+are what gets cached; the expense rows listed under them are read per
+request (expense_rows) and attached with with_expenses(). Pages spanning
+more than EXPENSE_SYNC_REPORT_DAYS read those rows from a background job
+instead (jobs.summary_page_rows).
+"""
+from datetime import date
+from decimal import Decimal
+
+from django.db.models import Sum
+
+from . import periods
+from .money import from_cents
+
+
+def _bounds(period_func):
+    """(first day, last day) of the period containing a date."""
+    def bounds(day):
+        period = period_func(day)
+        return period.start, period.last_day
+    return bounds
+
+
+def _format_day(start, end):
+    return start.strftime('%d-%m-%Y')
+
+
+def _format_range(start, end):
+    return f"{start.strftime('%d-%m-%Y')} to {end.strftime('%d-%m-%Y')}"
+
+
+# filter type -> (serial prefix, bucket bounds for a date, range label)
+BUCKET_TYPES = {
+    'daily': ('D', _bounds(periods.day), _format_day),
+    'weekly': ('W', _bounds(periods.iso_week), _format_range),
+    'monthly': ('M', _bounds(periods.month), _format_range),
+    'yearly': ('Y', _bounds(periods.year), _format_range),
+}
+
+
+def iter_buckets(days, filter_type):
+    """
+    Yield one bucket dict per period from (date, cents, count) rows sorted by date.
+
+    Each bucket holds its serial, date range label, start/end dates, the total
+    amount (a Decimal, summed in integer cents) and its number of expenses.
+    Buckets are plain values, small enough to cache.
+    """
+    if filter_type not in BUCKET_TYPES:
+        return
+    prefix, bounds, label = BUCKET_TYPES[filter_type]
+
+    bucket = None
+    serial = 0
+    for day, cents, count in days:
+        if bucket is None or day > bucket['end']:
+            if bucket is not None:
+                bucket['total'] = from_cents(bucket['total'])
+                yield bucket
+            start, end = bounds(day)
+            serial += 1
+            bucket = {
+                'serial': f"{prefix}{serial}",
+                'range': label(start, end),
+                'start': start,
+                'end': end,
+                'total': 0,
+                'count': 0,
+            }
+        bucket['total'] += cents
+        bucket['count'] += count
+
+    if bucket is not None:
+        bucket['total'] = from_cents(bucket['total'])
+        yield bucket
+
+
+def _daily_totals(rollup_queryset):
+    return (rollup_queryset.values('date').annotate(cents=Sum('total_cents'), count=Sum('count'))
+            .order_by('date').values_list('date', 'cents', 'count'))
+
+
+def group_totals(rollup_queryset, filter_type):
+    """Bucket totals from a queryset of daily rollups, in a single query."""
+    if filter_type not in BUCKET_TYPES:
+        return []
+    return list(iter_buckets(_daily_totals(rollup_queryset), filter_type))
+
+
+async def agroup_totals(rollup_queryset, filter_type):
+    """group_totals() for async views."""
+    if filter_type not in BUCKET_TYPES:
+        return []
+    return list(iter_buckets([row async for row in _daily_totals(rollup_queryset)], filter_type))
+
+
+# what the summary page shows of each expense
+EXPENSE_ROW_FIELDS = ('id', 'date', 'title', 'category', 'amount', 'description')
+
+
+def expense_rows(queryset):
+    """The expenses listed under the buckets, as value dicts sorted by date."""
+    return queryset.order_by('date', 'id').values(*EXPENSE_ROW_FIELDS)
+
+
+def rows_from_json(data):
+    """expense_rows() values back from their JSON form (as a summary_page job stores them)."""
+    return [{**row, 'date': date.fromisoformat(row['date']), 'amount': Decimal(row['amount'])} for row in data]
+
+
+def bucket_days(buckets):
+    """Number of days the buckets span, first to last."""
+    return (buckets[-1]['end'] - buckets[0]['start']).days + 1 if buckets else 0
+
+
+def with_expenses(buckets, rows):
+    """Copies of the buckets, each with the list of its expense rows under 'expenses'."""
+    grouped = [{**bucket, 'expenses': []} for bucket in buckets]
+    index = 0
+    for row in rows:
+        while index < len(grouped) and row['date'] > grouped[index]['end']:
+            index += 1
+        if index == len(grouped):
+            break
+        if row['date'] >= grouped[index]['start']:
+            grouped[index]['expenses'].append(row)
+    return grouped
@@ -0,0 +1,148 @@
+"""
+Streaming parsers for bank statement files (CSV and OFX).
+
+Each parser reads its file line by line and yields ParsedRow tuples, so an
+import never holds more than the current chunk of rows in memory.
+"""
+import csv
+import re
+from collections import namedtuple
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+ParsedRow = namedtuple('ParsedRow', ['line', 'date', 'title', 'amount', 'category', 'description'])
+
+
+class RowError(ValueError):
+    """A single input row could not be parsed."""
+    def __init__(self, line, message):
+        super().__init__(f"line {line}: {message}")
+        self.line = line
+
+
+# Accepted header names (lower-cased) for each Expense field in CSV files
+CSV_COLUMNS = {
+    'date': ['date', 'transaction date', 'posted date', 'posting date', 'value date'],
+    'title': ['title', 'payee', 'merchant', 'name', 'narration', 'description'],
+    'amount': ['amount', 'debit', 'withdrawal', 'value'],
+    'category': ['category'],
+    'description': ['description', 'memo', 'notes', 'details'],
+}
+DATE_FORMATS = ['%Y-%m-%d', '%d-%m-%Y', '%d/%m/%Y', '%m/%d/%Y', '%Y/%m/%d']
+TITLE_MAX_LENGTH = 200
+CENT = Decimal('0.01')
+# Expense.amount is DecimalField(max_digits=10, decimal_places=2)
+AMOUNT_MAX = Decimal('99999999.99')
+
+
+def parse_amount(value, line):
+    """Parse an amount; statement debits are often negative, so take the absolute value."""
+    cleaned = re.sub(r'[^\d.\-]', '', value or '')
+    try:
+        amount = abs(Decimal(cleaned)).quantize(CENT)
+    except InvalidOperation:
+        raise RowError(line, f"invalid amount {value!r}")
+    if amount <= 0:
+        raise RowError(line, "amount must be greater than 0")
+    if amount > AMOUNT_MAX:
+        raise RowError(line, f"amount {value!r} exceeds {AMOUNT_MAX}")
+    return amount
+
+
+def parse_date(value, line, formats=DATE_FORMATS):
+    value = (value or '').strip()
+    for fmt in formats:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    raise RowError(line, f"invalid date {value!r}")
+
+
+def _resolve_columns(header):
+    """Map Expense fields to CSV column indexes using CSV_COLUMNS."""
+    names = [name.strip().lower() for name in header]
+    columns = {}
+    for field, candidates in CSV_COLUMNS.items():
+        for candidate in candidates:
+            if candidate in names and names.index(candidate) not in columns.values():
+                columns[field] = names.index(candidate)
+                break
+    missing = {'date', 'title', 'amount'} - set(columns)
+    if missing:
+        raise ValueError(f"CSV header is missing column(s) for: {', '.join(sorted(missing))}")
+    return columns
+
+
+def parse_csv(fileobj, date_formats=DATE_FORMATS):
+    """Yield ParsedRow (or RowError) for every data row of a CSV statement."""
+    reader = csv.reader(fileobj)
+    header = next(reader, None)
+    if header is None:
+        return
+    columns = _resolve_columns(header)
+
+    def cell(row, field):
+        index = columns.get(field)
+        return row[index].strip() if index is not None and index < len(row) else ''
+
+    for row in reader:
+        line = reader.line_num
+        if not any(value.strip() for value in row):
+            continue
+        try:
+            yield ParsedRow(
+                line=line,
+                date=parse_date(cell(row, 'date'), line, date_formats),
+                title=cell(row, 'title')[:TITLE_MAX_LENGTH] or 'Imported expense',
+                amount=parse_amount(cell(row, 'amount'), line),
+                category=cell(row, 'category'),
+                description=cell(row, 'description') or None,
+            )
+        except RowError as error:
+            yield error
+
+
+OFX_TAG = re.compile(r'<(/?)(\w+)>([^<\r\n]*)')
+
+
+def parse_ofx(fileobj):
+    """Yield ParsedRow (or RowError) for every <STMTTRN> of an OFX (SGML or XML) statement."""
+    transaction = None
+    for line, text in enumerate(fileobj, 1):
+        for closing, tag, value in OFX_TAG.findall(text):
+            tag = tag.upper()
+            if tag == 'STMTTRN':
+                if not closing:
+                    transaction = {'line': line}
+                elif transaction is not None:
+                    yield _ofx_row(transaction)
+                    transaction = None
+            elif transaction is not None and not closing:
+                transaction[tag] = value.strip()
+
+
+def _ofx_row(transaction):
+    line = transaction['line']
+    try:
+        name = transaction.get('NAME') or transaction.get('MEMO') or 'Imported expense'
+        return ParsedRow(
+            line=line,
+            date=parse_date(transaction.get('DTPOSTED', '')[:8], line, ['%Y%m%d']),
+            title=name[:TITLE_MAX_LENGTH],
+            amount=parse_amount(transaction.get('TRNAMT'), line),
+            category='',
+            description=transaction.get('MEMO') if transaction.get('NAME') else None,
+        )
+    except RowError as error:
+        return error
+
+
+PARSERS = {
+    'csv': parse_csv,
+    'ofx': parse_ofx,
+}
+
+
+def detect_format(path):
+    return 'ofx' if path.lower().endswith(('.ofx', '.qfx')) else 'csv'
@@ -0,0 +1,319 @@
+"""
+Background jobs: reports and exports too slow to build inside a request.
+
+A Job row is the queue entry. Views enqueue() one and answer 202 Accepted
+with its status URL (/api/jobs/<id>/); `manage.py run_worker` claims queued
+jobs, runs them in a process pool and stores each result as a file (default
+storage, under job_results/) for /api/jobs/<id>/download/.
+
+Claiming is a conditional UPDATE - status and lease are checked in its
+WHERE clause - so any number of workers share the table on any database
+without row locks. The worker renews the lease of every job it is running;
+if it dies, the lease runs out and another worker claims the job again.
+Failed attempts are retried with exponential backoff, up to
+EXPENSE_JOB_MAX_ATTEMPTS runs in all. Workers delete finished jobs, and
+their result files, EXPENSE_JOB_RESULT_DAYS after they finish.
+"""
+import hashlib
+import json
+import logging
+import os
+import socket
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from datetime import timedelta
+from functools import partial
+from multiprocessing import get_context
+from typing import Callable, NamedTuple
+
+import django
+from django.conf import settings
+from django.core.files import File
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Expense, Job
+
+logger = logging.getLogger(__name__)
+
+CLAIM_BATCH = 10  # candidates read per claim; others may win some of them
+PURGE_INTERVAL = 3600  # seconds between a worker's sweeps for expired jobs
+PURGE_BATCH = 500
+
+
+def lease_seconds():
+    return getattr(settings, 'EXPENSE_JOB_LEASE_SECONDS', 300)
+
+
+def max_attempts():
+    return getattr(settings, 'EXPENSE_JOB_MAX_ATTEMPTS', 3)
+
+
+def result_days():
+    return getattr(settings, 'EXPENSE_JOB_RESULT_DAYS', 7)
+
+
+def retry_delay(attempts):
+    """Wait before retrying a job that failed its `attempts`-th run."""
+    return timedelta(seconds=getattr(settings, 'EXPENSE_JOB_RETRY_DELAY', 30) * 2 ** (attempts - 1))
+
+
+# Job kinds. Each run(user, params, out) writes its result to the binary file `out`.
+
+class JobKind(NamedTuple):
+    run: Callable
+    content_type: str
+    extension: str
+
+
+def _write_json(out, data):
+    out.write(json.dumps(data, cls=DjangoJSONEncoder).encode())
+
+
+def run_summary(user, params, out):
+    from .api_views import summary_data, summary_params, summary_queryset
+    params = summary_params(params)
+    _write_json(out, summary_data(list(summary_queryset(user, **params)), **params))
+
+
+def run_monthly_stats(user, params, out):
+    from .api_views import monthly_stats_data, monthly_stats_period, monthly_stats_queryset
+    _write_json(out, monthly_stats_data(list(monthly_stats_queryset(user, monthly_stats_period()))))
+
+
+def run_export(user, params, out, fmt):
+    from .exports import STREAMERS, export_rows
+    from .search import search_expenses
+    qs = Expense.objects.filter(user=user)
+    if params.get('category'):
+        qs = qs.filter(category=params['category'])
+    if params.get('date'):
+        qs = qs.filter(date=params['date'])
+    if params.get('search'):
+        qs = search_expenses(qs, params['search'])
+    _content_type, streamer = STREAMERS[fmt]
+    for chunk in streamer(export_rows(qs.order_by('-date', '-id'))):
+        out.write(chunk.encode())
+
+
+def run_summary_page(user, params, out):
+    from .grouping import expense_rows
+    qs = Expense.objects.filter(user=user)
+    if params.get('category') and params['category'] != 'All':
+        qs = qs.filter(category=params['category'])
+    _write_json(out, list(expense_rows(qs)))
+
+
+JOB_KINDS = {
+    'summary': JobKind(run_summary, 'application/json', 'json'),
+    'monthly_stats': JobKind(run_monthly_stats, 'application/json', 'json'),
+    'export_csv': JobKind(partial(run_export, fmt='csv'), 'text/csv', 'csv'),
+    'export_ndjson': JobKind(partial(run_export, fmt='ndjson'), 'application/x-ndjson', 'ndjson'),
+    'summary_page': JobKind(run_summary_page, 'application/json', 'json'),
+}
+
+
+# Queue
+
+def params_key(params):
+    return hashlib.sha1(json.dumps(params, sort_keys=True, cls=DjangoJSONEncoder).encode()).hexdigest()
+
+
+def enqueue(user, kind, params=None):
+    """Queue a job, or return the identical one this user already has pending."""
+    if kind not in JOB_KINDS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    params = params or {}
+    key = params_key(params)
+    pending = Job.objects.filter(user=user, kind=kind, params_key=key, status__in=[Job.QUEUED, Job.RUNNING])
+    job = pending.first()
+    if job is not None:
+        return job
+    try:
+        with transaction.atomic():
+            return Job.objects.create(user=user, kind=kind, params=params, params_key=key)
+    except IntegrityError:
+        # an identical request queued it first (job_one_pending_per_params);
+        # any other integrity error leaves nothing pending to return
+        job = pending.first()
+        if job is None:
+            raise
+        return job
+
+
+def summary_page_rows(user, category, version):
+    """
+    The expenses listed on a summary page too long to read inline: (rows, None)
+    from a job finished for this data version, else ([], the job preparing them).
+    """
+    from .grouping import rows_from_json
+    params = {'category': category, 'version': version}
+    done = Job.objects.filter(user=user, kind='summary_page', params_key=params_key(params),
+                              status=Job.SUCCEEDED).order_by('-finished_at').first()
+    if done is not None:
+        try:
+            with done.result.open('rb') as result:
+                return rows_from_json(json.load(result)), None
+        except FileNotFoundError:
+            pass  # expired: prepare it again
+    return [], enqueue(user, 'summary_page', params)
+
+
+def _claimable(now):
+    return (Q(status=Job.QUEUED, run_after__lte=now)
+            | Q(status=Job.RUNNING, lease_expires_at__lt=now, attempts__lt=max_attempts()))
+
+
+def claim_next(worker):
+    """Lease the next due job to `worker`; None when there is none."""
+    now = timezone.now()
+    candidates = Job.objects.filter(_claimable(now)).order_by('run_after', 'id').values_list('pk', flat=True)
+    for pk in candidates[:CLAIM_BATCH]:
+        claimed = Job.objects.filter(_claimable(now), pk=pk).update(
+            status=Job.RUNNING, worker=worker, attempts=F('attempts') + 1, started_at=now,
+            lease_expires_at=now + timedelta(seconds=lease_seconds()),
+        )
+        if claimed:
+            return Job.objects.get(pk=pk)
+    return None
+
+
+def renew_leases(worker, pks):
+    Job.objects.filter(pk__in=pks, worker=worker, status=Job.RUNNING).update(
+        lease_expires_at=timezone.now() + timedelta(seconds=lease_seconds()))
+
+
+def fail_abandoned():
+    """Fail jobs whose worker died on their last allowed attempt."""
+    return Job.objects.filter(status=Job.RUNNING, lease_expires_at__lt=timezone.now(),
+                              attempts__gte=max_attempts()).update(
+        status=Job.FAILED, error="Worker stopped responding.", lease_expires_at=None, finished_at=timezone.now())
+
+
+def purge_finished():
+    """Delete jobs finished more than EXPENSE_JOB_RESULT_DAYS ago, with their result files."""
+    expired = Job.objects.filter(status__in=[Job.SUCCEEDED, Job.FAILED],
+                                 finished_at__lt=timezone.now() - timedelta(days=result_days()))
+    purged = 0
+    while batch := list(expired.only('pk', 'result')[:PURGE_BATCH]):
+        for job in batch:
+            if job.result:
+                job.result.delete(save=False)
+        purged += Job.objects.filter(pk__in=[job.pk for job in batch]).delete()[0]
+    return purged
+
+
+def run_job(pk, worker):
+    """
+    Run a job claimed by `worker` and record the outcome; returns its new
+    status. Nothing is recorded if the lease was lost to another worker.
+    """
+    job = Job.objects.select_related('user').get(pk=pk)
+    kind = JOB_KINDS[job.kind]
+    ours = Job.objects.filter(pk=pk, worker=worker, status=Job.RUNNING)
+    try:
+        with tempfile.TemporaryFile() as out:
+            kind.run(job.user, job.params, out)
+            out.seek(0)
+            job.result.save(f"{job.kind}-{pk}.{kind.extension}", File(out), save=False)
+    except Exception as e:
+        logger.exception(f"Job {job} failed (attempt {job.attempts})")
+        error = f"{type(e).__name__}: {e}"
+        if job.attempts < max_attempts():
+            status = Job.QUEUED
+            ours.update(status=status, error=error, worker='', lease_expires_at=None,
+                        run_after=timezone.now() + retry_delay(job.attempts))
+        else:
+            status = Job.FAILED
+            ours.update(status=status, error=error, lease_expires_at=None, finished_at=timezone.now())
+        return status
+
+    if not ours.update(status=Job.SUCCEEDED, result=job.result.name, error='', lease_expires_at=None,
+                       finished_at=timezone.now()):
+        job.result.delete(save=False)
+        return None
+    return Job.SUCCEEDED
+
+
+# Worker
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _pooled_run_job(pk, worker):
+    # pool processes live long: drop broken or expired connections, like requests do
+    close_old_connections()
+    try:
+        return run_job(pk, worker)
+    finally:
+        close_old_connections()
+
+
+class _InlineExecutor:
+    """Runs each job in the worker process itself (processes=0)."""
+
+    def submit(self, fn, *args):
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+def work(processes=None, poll_interval=1.0, burst=False):
+    """
+    Claim and run jobs until interrupted (or, with `burst`, until none are
+    due). Returns a Counter of the outcomes.
+    """
+    if processes is None:
+        processes = getattr(settings, 'EXPENSE_WORKER_PROCESSES', None) or os.cpu_count()
+    worker = worker_name()
+    outcomes = Counter()
+    if processes:
+        # spawn, not fork: children must not share the parent's database connections.
+        # They start from a fresh interpreter, set up before any job is unpickled.
+        executor = ProcessPoolExecutor(processes, mp_context=get_context('spawn'), initializer=django.setup)
+        run = _pooled_run_job
+    else:
+        executor, run = _InlineExecutor(), run_job
+    running = {}
+    renewed = time.monotonic()
+    purged = None
+    with executor:
+        while True:
+            if purged is None or time.monotonic() - purged > PURGE_INTERVAL:
+                if count := purge_finished():
+                    logger.info(f"Deleted {count} finished job(s) older than {result_days()} days")
+                purged = time.monotonic()
+            fail_abandoned()
+            while len(running) < max(processes, 1) and (job := claim_next(worker)):
+                running[executor.submit(run, job.pk, worker)] = job.pk
+            if not running:
+                if burst:
+                    return outcomes
+                time.sleep(poll_interval)
+                continue
+            done, _ = wait(running, timeout=poll_interval, return_when=FIRST_COMPLETED)
+            for future in done:
+                pk = running.pop(future)
+                try:
+                    outcomes[future.result() or 'lost'] += 1
+                except Exception:
+                    # e.g. the database went away; the lease lets another worker retry
+                    logger.exception(f"Job {pk} could not be run")
+                    outcomes['error'] += 1
+            if running and time.monotonic() - renewed > lease_seconds() / 3:
+                renew_leases(worker, list(running.values()))
+                renewed = time.monotonic()
@@ -0,0 +1,121 @@
+"""
+Keyword categorization shared by the pre_save signal and the classifier fallback.
+
+All keywords are compiled into one regular expression shaped like a trie
+(common prefixes are factored out, e.g. ``bu(?:s|rger)``), so a search walks
+the text once and at each position only follows branches that match the next
+character. Its cost grows with the length of the text, not with the number of
+keywords, which keeps matching cheap as the table grows to thousands of
+merchant names.
+
+The table maps each category to its keywords, and its order is the priority:
+a text containing keywords of several categories gets the one listed first,
+wherever in the text they appear ("pizza bus" is Food). Projects can replace
+it with the EXPENSE_CATEGORY_KEYWORDS setting.
+"""
+import re
+import threading
+
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+DEFAULT_CATEGORY_KEYWORDS = {
+    'Food': ['food', 'pizza', 'restaurant', 'groceries'],
+    'Travel': ['transport', 'uber', 'bus', 'travel'],
+    'Entertainment': ['entertainment', 'movie', 'netflix'],
+    'Utilities': ['utilities', 'electricity'],
+    'Sharing': ['sharing'],
+    'Other': ['other', 'others'],
+}
+
+_END = ''
+
+
+def _trie_pattern(node):
+    """Regex for a trie node; longer keywords are preferred where they overlap."""
+    ends_here = _END in node
+    branches = [re.escape(char) + _trie_pattern(child) for char, child in sorted(node.items()) if char != _END]
+    if not branches:
+        return ''
+    if len(branches) == 1:
+        body = branches[0]
+        if ends_here:
+            return f'(?:{body})?' if len(body) > 1 else f'{body}?'
+        return body
+    body = f'(?:{"|".join(branches)})'
+    return body + '?' if ends_here else body
+
+
+class KeywordMatcher:
+    """Find the first category, in table order, with a keyword in a text."""
+
+    def __init__(self, table):
+        self.categories = {}
+        for category, keywords in table.items():
+            for keyword in keywords:
+                keyword = ' '.join(str(keyword).lower().split())
+                if keyword:
+                    self.categories.setdefault(keyword, category)
+
+        # The regex reports the longest keyword at each position; rank each
+        # keyword by the best category among it and its keyword prefixes, which
+        # are exactly the other keywords that start at the same position.
+        self.order = list(table)
+        position = {category: index for index, category in enumerate(self.order)}
+        self.ranks = {
+            keyword: min(position[self.categories[keyword[:end]]]
+                         for end in range(1, len(keyword) + 1) if keyword[:end] in self.categories)
+            for keyword in self.categories
+        }
+
+        trie = {}
+        for keyword in self.categories:
+            node = trie
+            for char in keyword:
+                node = node.setdefault(char, {})
+            node[_END] = True
+        # a lookahead matches at every position, so overlapping keywords are all seen
+        self.pattern = re.compile(f'(?=({_trie_pattern(trie)}))') if trie else None
+
+    def exact(self, text):
+        """Category for a text that is itself a keyword, or None."""
+        return self.categories.get(str(text or '').lower())
+
+    def search(self, text):
+        """Category listed first in the table among the keywords in `text`, or None."""
+        if self.pattern is None or not text:
+            return None
+        best = None
+        for match in self.pattern.finditer(str(text).lower()):
+            rank = self.ranks[match.group(1)]
+            if best is None or rank < best:
+                best = rank
+                if best == 0:
+                    break
+        return None if best is None else self.order[best]
+
+
+_matcher = None
+_matcher_lock = threading.Lock()
+
+
+def get_matcher():
+    global _matcher
+    if _matcher is None:
+        with _matcher_lock:
+            if _matcher is None:
+                from django.conf import settings
+                _matcher = KeywordMatcher(getattr(settings, 'EXPENSE_CATEGORY_KEYWORDS', DEFAULT_CATEGORY_KEYWORDS))
+    return _matcher
+
+
+@receiver(setting_changed)
+def _reset_matcher(setting, **kwargs):
+    global _matcher
+    if setting == 'EXPENSE_CATEGORY_KEYWORDS':
+        _matcher = None
+
+
+def keyword_category(text):
+    """Rule-based category for well known merchants, or None."""
+    return get_matcher().search(text)
@@ -0,0 +1,223 @@
+"""
+Live dashboard feed: pushes a user's totals over Server-Sent Events when
+their expenses change, so dashboards don't have to poll.
+
+Every rollup write (rollups.apply_deltas: signals, bulk, imports,
+recategorizing) publishes its per-category deltas once its transaction
+commits. A broker fans them out to the user's open streams:
+
+- LocalBroker (default): in-process, for a single ASGI server process.
+- RedisBroker: Redis pub/sub, when writes and streams live in different
+  processes (e.g. gunicorn for pages, uvicorn for streams). Enabled by the
+  EXPENSE_LIVE_REDIS_URL setting; needs the `redis` package.
+
+Each stream (async_views.live_feed) sends the current totals on connect,
+then fresh totals plus the merged deltas after every batch of changes.
+Pages only open a stream when an ASGI server serves it (live_updates()).
+"""
+import asyncio
+import json
+import threading
+from collections import defaultdict
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.handlers.asgi import ASGIRequest
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.db.models import Sum
+from django.dispatch import receiver
+
+from .models import ExpenseDailyRollup
+from .money import cents_to_float
+
+# Events buffered per stream; past this the oldest are dropped (the next
+# totals are still exact, only that change's delta is lost).
+QUEUE_SIZE = 100
+# Idle streams get a comment line this often, so proxies keep them open.
+HEARTBEAT_SECONDS = 15
+
+
+def live_updates(request):
+    """
+    Whether a page rendered for `request` should open the live stream: it
+    came in through ASGI, or EXPENSE_LIVE_UPDATES says /async/live/ is routed
+    to an ASGI server even though this page was rendered under WSGI.
+    """
+    from django.conf import settings
+    return isinstance(request, ASGIRequest) or getattr(settings, 'EXPENSE_LIVE_UPDATES', False)
+
+
+def channel_name(user_id):
+    return f"expenses:live:{user_id}"
+
+
+class _LocalSubscription:
+    def __init__(self, broker, user_id):
+        self.broker = broker
+        self.user_id = user_id
+        self.queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.loop = asyncio.get_running_loop()
+
+    async def __aenter__(self):
+        self.broker._add(self)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.broker._remove(self)
+
+    def offer(self, event):
+        """Queue an event from any thread."""
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # the stream's event loop is gone
+            self.broker._remove(self)
+
+    def _put(self, event):
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout):
+        """Next event, or None after `timeout` seconds (0: only what's already queued)."""
+        if not timeout:
+            return None if self.queue.empty() else self.queue.get_nowait()
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class LocalBroker:
+    """Fans events out to the streams of this process."""
+
+    def __init__(self):
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        """Async context manager yielding a subscription with `await get(timeout)`."""
+        return _LocalSubscription(self, user_id)
+
+    def publish(self, user_id, event):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            subscription.offer(event)
+
+    def _add(self, subscription):
+        with self._lock:
+            self._subscriptions[subscription.user_id].add(subscription)
+
+    def _remove(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+
+class _RedisSubscription:
+    def __init__(self, url, user_id):
+        import redis.asyncio
+        self.client = redis.asyncio.Redis.from_url(url)
+        self.channel = channel_name(user_id)
+
+    async def __aenter__(self):
+        self.pubsub = self.client.pubsub()
+        await self.pubsub.subscribe(self.channel)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.pubsub.unsubscribe(self.channel)
+        await self.pubsub.aclose()
+        await self.client.aclose()
+
+    async def get(self, timeout):
+        message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=timeout or 0)
+        return json.loads(message['data']) if message else None
+
+
+class RedisBroker:
+    """Fans events out through Redis pub/sub, to streams in any process."""
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured("EXPENSE_LIVE_REDIS_URL requires the 'redis' package.")
+        self.url = url
+        self._client = redis.Redis.from_url(url)
+
+    def subscribe(self, user_id):
+        return _RedisSubscription(self.url, user_id)
+
+    def publish(self, user_id, event):
+        self._client.publish(channel_name(user_id), json.dumps(event))
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                from django.conf import settings
+                url = getattr(settings, 'EXPENSE_LIVE_REDIS_URL', None)
+                _broker = RedisBroker(url) if url else LocalBroker()
+    return _broker
+
+
+@receiver(setting_changed)
+def _reset_broker(setting, **kwargs):
+    global _broker
+    if setting == 'EXPENSE_LIVE_REDIS_URL':
+        _broker = None
+
+
+def publish_deltas(deltas):
+    """Publish rollup deltas ({(user_id, date, category): [cents, count]}) per user."""
+    changes = defaultdict(list)
+    for (user_id, date, category), (cents, count) in deltas.items():
+        changes[user_id].append([date.isoformat(), category, cents, count])
+    broker = get_broker()
+    for user_id, user_changes in changes.items():
+        broker.publish(user_id, {'changes': user_changes})
+
+
+def publish_on_commit(deltas):
+    """publish_deltas() once the current transaction commits; a failing broker never fails the write."""
+    transaction.on_commit(lambda: publish_deltas(deltas), robust=True)
+
+
+def merge_changes(events):
+    """Sum the changes of several events into {category: {'total', 'count'}}."""
+    merged = defaultdict(lambda: [0, 0])
+    for event in events:
+        for _date, category, cents, count in event['changes']:
+            merged[category][0] += cents
+            merged[category][1] += count
+    return {category: {'total': cents_to_float(cents), 'count': count}
+            for category, (cents, count) in merged.items()}
+
+
+def _stats(cents, count):
+    return {'total': cents_to_float(cents), 'count': count,
+            'average': round(cents_to_float(cents, count), 2) if count else 0}
+
+
+async def atotals(user_id):
+    """The user's all-time totals, overall and per category, from the daily rollups."""
+    rows = [row async for row in ExpenseDailyRollup.objects.filter(user_id=user_id)
+            .values('category').annotate(cents=Sum('total_cents'), count=Sum('count')).order_by('category')]
+    data = _stats(sum(row['cents'] for row in rows), sum(row['count'] for row in rows))
+    data['by_category'] = {row['category']: _stats(row['cents'], row['count']) for row in rows}
+    return data
+
+
+def sse_message(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
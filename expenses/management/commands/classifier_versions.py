@@ -0,0 +1,40 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from expenses.classifier_registry import RegistryError, get_registry
+
+
+class Command(BaseCommand):
+    help = "List, register or activate versions of the expense classifier."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--register', metavar='PATH', help="Register a joblib (vectorizer, model) artifact.")
+        parser.add_argument('--note', default='', help="Free-form note stored in the new version's metadata.")
+        parser.add_argument('--no-activate', action='store_true', help="Register without activating.")
+        parser.add_argument('--activate', metavar='VERSION', help="Make VERSION the active classifier.")
+
+    def handle(self, *args, **options):
+        registry = get_registry()
+        try:
+            if options['register']:
+                version = registry.register(
+                    source_path=options['register'],
+                    metadata={'source': options['register'], 'note': options['note']},
+                    activate=not options['no_activate'],
+                )
+                self.stdout.write(self.style.SUCCESS(f"Registered {version}."))
+            if options['activate']:
+                registry.activate(options['activate'])
+                self.stdout.write(self.style.SUCCESS(f"Activated {options['activate']}."))
+        except (OSError, RegistryError) as error:
+            raise CommandError(str(error))
+
+        active = registry.active_version()
+        for version in registry.versions():
+            marker = '*' if version == active else ' '
+            meta = registry.metadata(version)
+            details = {k: v for k, v in meta.items() if k not in ('version', 'created_at')}
+            self.stdout.write(f"{marker} {version}  {meta.get('created_at', '')}  {json.dumps(details, default=str)}")
+        if active is None:
+            self.stdout.write("(no registered version active; using the bundled expense_classifier.pkl)")
@@ -0,0 +1,153 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import islice
+
+import django
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+
+from expenses import caching, rollups
+from expenses.ai_utils import normalize_prediction
+from expenses.bulk import prepare_expenses
+from expenses.importers import PARSERS, RowError, detect_format
+from expenses.models import Expense, ImportCheckpoint
+
+VALID_CATEGORIES = {choice for choice, _ in Expense.CATEGORY_CHOICES}
+
+
+def _init_worker():
+    # Child processes must not reuse the parent's database connections.
+    if not apps.ready:
+        django.setup()
+    connections.close_all()
+
+
+def import_file(path, user_id, fmt=None, batch_size=2000, restart=False):
+    """
+    Import one statement file for a user in committed chunks.
+
+    Each chunk is categorized in one batch, written with bulk_create and its
+    rollup deltas applied in the same transaction that advances the file's
+    ImportCheckpoint, so re-running after a crash skips exactly the rows
+    already stored. Imported rows point at that checkpoint; `restart` deletes
+    them before importing the file again. Returns a stats dict.
+    """
+    started = time.perf_counter()
+    source = os.path.abspath(path)
+    file_size = os.path.getsize(source)
+    checkpoint, _ = ImportCheckpoint.objects.get_or_create(user_id=user_id, source=source)
+    if restart:
+        # post_delete signals add their rollup deltas to the deferred batch
+        with transaction.atomic(), rollups.deferred():
+            checkpoint.expenses.all().delete()
+            checkpoint.rows_done, checkpoint.finished = 0, False
+            checkpoint.save()
+    elif checkpoint.rows_done and checkpoint.file_size != file_size:
+        raise CommandError(f"{path} changed since its last import; use --restart to import it again.")
+    stats = {'path': path, 'imported': 0, 'skipped': checkpoint.rows_done, 'errors': [], 'seconds': 0.0}
+    if checkpoint.finished:
+        stats['already_done'] = True
+        return stats
+
+    checkpoint.file_size = file_size
+    parser = PARSERS[fmt or detect_format(path)]
+    with open(source, newline='', encoding='utf-8-sig') as fileobj:
+        rows = islice(parser(fileobj), checkpoint.rows_done, None)
+        while True:
+            chunk = list(islice(rows, batch_size))
+            if not chunk:
+                break
+            expenses = []
+            for row in chunk:
+                if isinstance(row, RowError):
+                    stats['errors'].append(str(row))
+                    continue
+                category = row.category
+                if category and category not in VALID_CATEGORIES:
+                    category = normalize_prediction(category)
+                expenses.append(Expense(
+                    user_id=user_id, date=row.date, title=row.title, amount=row.amount,
+                    category=category, description=row.description, import_checkpoint=checkpoint,
+                ))
+
+            with transaction.atomic():
+                prepare_expenses(expenses)
+                Expense.objects.bulk_create(expenses, batch_size=batch_size)
+                deltas = rollups.new_deltas()
+                for expense in expenses:
+                    rollups.add_expense(deltas, expense)
+                rollups.apply_deltas(deltas)
+                caching.invalidate([user_id])
+                checkpoint.rows_done += len(chunk)
+                checkpoint.save()
+            stats['imported'] += len(expenses)
+
+    checkpoint.finished = True
+    checkpoint.save()
+    stats['seconds'] = time.perf_counter() - started
+    return stats
+
+
+class Command(BaseCommand):
+    help = "Import expenses for a user from bank statement files (CSV or OFX)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='+', help="CSV/OFX statement files.")
+        parser.add_argument('--user', required=True, help="Username that owns the imported expenses.")
+        parser.add_argument('--format', choices=sorted(PARSERS), help="Input format (default: from file extension).")
+        parser.add_argument('--batch-size', type=int, default=2000, help="Rows per committed chunk.")
+        parser.add_argument('--workers', type=int, default=1, help="Import this many files in parallel processes.")
+        parser.add_argument('--restart', action='store_true', help="Delete the rows earlier runs imported from these files, then import them from the start.")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"User '{options['user']}' does not exist.")
+        for path in options['files']:
+            if not os.path.isfile(path):
+                raise CommandError(f"File not found: {path}")
+
+        kwargs = {
+            'user_id': user.id,
+            'fmt': options['format'],
+            'batch_size': options['batch_size'],
+            'restart': options['restart'],
+        }
+        started = time.perf_counter()
+        results = []
+        if options['workers'] > 1 and len(options['files']) > 1:
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=options['workers'], initializer=_init_worker) as pool:
+                futures = [pool.submit(import_file, path, **kwargs) for path in options['files']]
+                for future in as_completed(futures):
+                    results.append(future.result())
+                    self._report(results[-1])
+        else:
+            for path in options['files']:
+                results.append(import_file(path, **kwargs))
+                self._report(results[-1])
+
+        imported = sum(result['imported'] for result in results)
+        elapsed = time.perf_counter() - started
+        rate = imported / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {imported} expense(s) from {len(results)} file(s) in {elapsed:.2f}s ({rate:,.0f} rows/s)."
+        ))
+
+    def _report(self, stats):
+        if stats.get('already_done'):
+            self.stdout.write(f"{stats['path']}: already imported, skipped (use --restart to re-import).")
+            return
+        for error in stats['errors'][:10]:
+            self.stderr.write(f"{stats['path']}: {error}")
+        if len(stats['errors']) > 10:
+            self.stderr.write(f"{stats['path']}: ... {len(stats['errors']) - 10} more row error(s)")
+        rate = stats['imported'] / stats['seconds'] if stats['seconds'] else 0
+        resumed = f", resumed after {stats['skipped']} row(s)" if stats['skipped'] else ""
+        self.stdout.write(
+            f"{stats['path']}: {stats['imported']} row(s) in {stats['seconds']:.2f}s ({rate:,.0f} rows/s{resumed})"
+        )
@@ -0,0 +1,58 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from expenses import caching, rollups
+from expenses.ai_utils import current_model_version, predict_categories
+from expenses.models import Expense
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-run the classifier over expenses it categorized with an older model version. "
+        "Categories chosen by users are never touched."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help="Only recategorize this user's expenses.")
+        parser.add_argument('--all', action='store_true',
+                            help="Include rows already categorized by the current version.")
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        version = current_model_version()
+        qs = Expense.objects.filter(category_model_version__isnull=False)
+        if not options['all']:
+            qs = qs.exclude(category_model_version=version)
+        if options['user']:
+            try:
+                qs = qs.filter(user=User.objects.get(username=options['user']))
+            except User.DoesNotExist:
+                raise CommandError(f"User '{options['user']}' does not exist.")
+
+        checked = changed = 0
+        last_pk = 0
+        while True:
+            # keyset over pk: rows already processed drop out of the stale set anyway
+            batch = list(qs.filter(pk__gt=last_pk).order_by('pk')[:options['batch_size']])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            predictions, used_version = predict_categories(
+                [(e.title or '') + ' ' + (e.description or '') for e in batch], return_version=True)
+
+            with transaction.atomic(), rollups.deferred() as deltas:
+                for expense, category in zip(batch, predictions):
+                    if category != expense.category:
+                        rollups.add_expense(deltas, expense, sign=-1)
+                        expense.category = category
+                        rollups.add_expense(deltas, expense)
+                        changed += 1
+                    expense.category_model_version = used_version
+                Expense.objects.bulk_update(batch, ['category', 'category_model_version'])
+                caching.invalidate({user_id for user_id, _, _ in deltas})
+            checked += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Checked {checked} expense(s) against classifier {version}; {changed} changed category."
+        ))
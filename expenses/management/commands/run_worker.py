@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from expenses import jobs
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (reports and exports) in a pool of worker processes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int,
+                            help="Pool size (default: EXPENSE_WORKER_PROCESSES, else one per CPU); "
+                                 "0 runs jobs in this process.")
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help="Seconds between checks for new jobs.")
+        parser.add_argument('--burst', action='store_true',
+                            help="Exit once no job is due instead of waiting for more.")
+
+    def handle(self, *args, **options):
+        if options['processes'] is not None and options['processes'] < 0:
+            raise CommandError("--processes must be 0 or more.")
+        try:
+            outcomes = jobs.work(processes=options['processes'], poll_interval=options['poll_interval'],
+                                 burst=options['burst'])
+        except KeyboardInterrupt:
+            # running jobs' leases expire and other workers pick them up
+            self.stdout.write("Stopped.")
+            return
+        summary = ", ".join(f"{count} {outcome}" for outcome, count in sorted(outcomes.items())) or "no jobs"
+        self.stdout.write(self.style.SUCCESS(f"Ran {summary}."))
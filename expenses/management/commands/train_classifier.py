@@ -0,0 +1,68 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from expenses import training
+from expenses.ai_utils import load_model
+from expenses.classifier_registry import RegistryError, get_registry
+
+
+class Command(BaseCommand):
+    help = (
+        "Train the expense categorizer from labelled expenses in bounded memory and "
+        "publish it as a new classifier version."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--incremental', action='store_true',
+                            help="Update the active version with rows changed since it was trained.")
+        parser.add_argument('--include-predicted', action='store_true',
+                            help="Also learn from categories the classifier assigned itself.")
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--epochs', type=int, default=1)
+        parser.add_argument('--holdout-every', type=int, default=10,
+                            help="Hold out every Nth row (by id) for evaluation.")
+        parser.add_argument('--no-activate', action='store_true', help="Register the new version without activating it.")
+
+    def handle(self, *args, **options):
+        registry = get_registry()
+        metadata = {'trainer': training.TRAINER, 'include_predicted': options['include_predicted']}
+        changed_since = None
+
+        if options['incremental']:
+            base_version = registry.active_version()
+            if base_version is None:
+                raise CommandError("No active classifier version to update; run a full training first.")
+            base = registry.metadata(base_version)
+            if base.get('trainer') != training.TRAINER:
+                raise CommandError(f"{base_version} was not trained by train_classifier; run a full training first.")
+            vectorizer, model = load_model(registry.artifact_path(base_version))
+            changed_since = parse_datetime(base['trained_until']) if base.get('trained_until') else None
+            metadata['incremental_from'] = base_version
+        else:
+            vectorizer, model = training.build_pipeline()
+
+        qs = training.labelled_rows(options['include_predicted'], changed_since=changed_since)
+        stats = training.train(
+            qs, vectorizer, model,
+            chunk_size=options['chunk_size'],
+            epochs=options['epochs'],
+            holdout_every=options['holdout_every'],
+            evaluate_on=training.labelled_rows(options['include_predicted']),
+        )
+        if not stats['trained_rows']:
+            self.stdout.write("No new labelled rows to train on; nothing published.")
+            return
+        metadata.update(stats)
+
+        try:
+            version = registry.register((vectorizer, model), metadata=metadata, activate=not options['no_activate'])
+        except (OSError, RegistryError) as error:
+            raise CommandError(str(error))
+
+        accuracy = stats['holdout_accuracy']
+        accuracy = f"{accuracy:.1%}" if accuracy is not None else "n/a"
+        self.stdout.write(self.style.SUCCESS(
+            f"Published {version}: {stats['trained_rows']} row(s) in {stats['train_seconds']:.2f}s "
+            f"({stats['rows_per_second'] or 0:,} rows/s), holdout accuracy {accuracy} "
+            f"on {stats['holdout_rows']} row(s)."
+        ))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 05:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0005_importcheckpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='expense',
+            name='category_model_version',
+            field=models.CharField(blank=True, max_length=32, null=True),
+        ),
+    ]
@@ -0,0 +1,88 @@
+from django.db import migrations
+
+# PostgreSQL: a generated tsvector column (title weighted above description),
+# so every write keeps it current, plus a GIN index over it.
+POSTGRES_FORWARD = [
+    """
+    ALTER TABLE expenses_expense ADD COLUMN search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX expense_search_vector_gin ON expenses_expense USING GIN (search_vector)",
+]
+POSTGRES_REVERSE = [
+    "DROP INDEX IF EXISTS expense_search_vector_gin",
+    "ALTER TABLE expenses_expense DROP COLUMN IF EXISTS search_vector",
+]
+
+# SQLite: an external-content FTS5 table over title/description, kept in
+# sync by triggers and filled from the existing rows.
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE expenses_expense_fts USING fts5(
+        title, description, content='expenses_expense', content_rowid='id',
+        tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER expenses_expense_fts_insert AFTER INSERT ON expenses_expense BEGIN
+        INSERT INTO expenses_expense_fts(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER expenses_expense_fts_delete AFTER DELETE ON expenses_expense BEGIN
+        INSERT INTO expenses_expense_fts(expenses_expense_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER expenses_expense_fts_update AFTER UPDATE OF title, description ON expenses_expense BEGIN
+        INSERT INTO expenses_expense_fts(expenses_expense_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO expenses_expense_fts(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+    "INSERT INTO expenses_expense_fts(expenses_expense_fts) VALUES ('rebuild')",
+]
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS expenses_expense_fts_insert",
+    "DROP TRIGGER IF EXISTS expenses_expense_fts_delete",
+    "DROP TRIGGER IF EXISTS expenses_expense_fts_update",
+    "DROP TABLE IF EXISTS expenses_expense_fts",
+]
+
+STATEMENTS = {
+    'postgresql': (POSTGRES_FORWARD, POSTGRES_REVERSE),
+    'sqlite': (SQLITE_FORWARD, SQLITE_REVERSE),
+}
+
+
+def _run(schema_editor, forward):
+    statements = STATEMENTS.get(schema_editor.connection.vendor)
+    if statements is None:
+        return  # other databases keep the LIKE-based search fallback
+    for sql in statements[0 if forward else 1]:
+        schema_editor.execute(sql)
+
+
+def add_search(apps, schema_editor):
+    _run(schema_editor, forward=True)
+
+
+def remove_search(apps, schema_editor):
+    _run(schema_editor, forward=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0009_expense_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_search, remove_search),
+    ]
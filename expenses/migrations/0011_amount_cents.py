@@ -0,0 +1,56 @@
+# Generated by Django 5.2.6 on 2026-10-18 06:40
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import F
+from django.db.models.functions import Cast, Round
+
+
+def cents(field):
+    # ROUND first: SQLite keeps decimals as REAL, where 12.34 * 100 is 1233.999...
+    return Cast(Round(F(field) * 100), models.BigIntegerField())
+
+
+def fill_cents(apps, schema_editor):
+    apps.get_model('expenses', 'Expense').objects.update(amount_cents=cents('amount'))
+    apps.get_model('expenses', 'ExpenseDailyRollup').objects.update(total_cents=cents('total'))
+
+
+def fill_total(apps, schema_editor):
+    ExpenseDailyRollup = apps.get_model('expenses', 'ExpenseDailyRollup')
+    batch = []
+    for rollup in ExpenseDailyRollup.objects.only('total_cents').iterator(chunk_size=1000):
+        rollup.total = Decimal(rollup.total_cents).scaleb(-2)
+        batch.append(rollup)
+        if len(batch) >= 1000:
+            ExpenseDailyRollup.objects.bulk_update(batch, ['total'])
+            batch = []
+    ExpenseDailyRollup.objects.bulk_update(batch, ['total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0010_expense_search'),
+    ]
+
+    operations = [
+        # Nullable with no default, so SQLite adds the column in place instead of
+        # rebuilding expenses_expense (which would drop the search triggers).
+        migrations.AddField(
+            model_name='expense',
+            name='amount_cents',
+            field=models.BigIntegerField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='expensedailyrollup',
+            name='total_cents',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_cents, fill_total),
+        migrations.RemoveField(
+            model_name='expensedailyrollup',
+            name='total',
+        ),
+    ]
@@ -0,0 +1,20 @@
+from django.db import migrations, models
+from django.db.models import F
+from django.db.models.functions import Cast, Round
+
+
+def fill_missing_cents(apps, schema_editor):
+    # rows loaded from fixtures before raw saves filled amount_cents; see 0011 for the ROUND
+    apps.get_model('expenses', 'Expense').objects.filter(amount_cents__isnull=True).update(
+        amount_cents=Cast(Round(F('amount') * 100), models.BigIntegerField()))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0012_job'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_missing_cents, migrations.RunPython.noop),
+    ]
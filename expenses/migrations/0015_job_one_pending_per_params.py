@@ -0,0 +1,42 @@
+# Generated by Django 5.2.6 on 2026-10-18 07:08
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def fail_duplicate_pending(apps, schema_editor):
+    # enqueue() could race before this constraint: keep the oldest of each set
+    Job = apps.get_model('expenses', 'Job')
+    kept = {}
+    for job in Job.objects.filter(status__in=['queued', 'running']).order_by('id'):
+        key = (job.user_id, job.kind, job.params_key)
+        if key in kept:
+            Job.objects.filter(pk=job.pk).update(status='failed', error=f"Duplicate of job #{kept[key]}.",
+                                                 lease_expires_at=None, finished_at=timezone.now())
+        else:
+            kept[key] = job.pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0014_covering_index_amount_cents'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(fail_duplicate_pending, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='job',
+            name='job_user_kind_params_idx',
+        ),
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(fields=['finished_at'], name='job_finished_at_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='job',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['queued', 'running'])), fields=('user', 'kind', 'params_key'), name='job_one_pending_per_params'),
+        ),
+    ]
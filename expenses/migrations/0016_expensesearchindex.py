@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-18 07:29
+
+import django.db.models.deletion
+import expenses.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0015_job_one_pending_per_params'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExpenseSearchIndex',
+            fields=[
+                ('expense', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_index', serialize=False, to='expenses.expense')),
+                ('query', expenses.models.FullTextQueryField(db_column='expenses_expense_fts')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'expenses_expense_fts',
+                'managed': False,
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-18 07:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0016_expensesearchindex'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='expense',
+            name='import_checkpoint',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='expenses', to='expenses.importcheckpoint'),
+        ),
+    ]
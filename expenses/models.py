@@ -1,6 +1,37 @@
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 from django.contrib.auth.models import User
 
+from .money import cents_expression, from_cents, to_cents
+
+
+class ExpenseQuerySet(models.QuerySet):
+    """Keeps amount_cents in step with amount on the writes that bypass save()."""
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.amount_cents = to_cents(obj.amount)
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        if 'amount' in fields and 'amount_cents' not in fields:
+            objs = list(objs)
+            for obj in objs:
+                obj.amount_cents = to_cents(obj.amount)
+            fields = [*fields, 'amount_cents']
+        return super().bulk_update(objs, fields, *args, **kwargs)
+
+    def update(self, **kwargs):
+        if 'amount' in kwargs and 'amount_cents' not in kwargs:
+            amount = kwargs['amount']
+            if hasattr(amount, 'resolve_expression'):
+                kwargs['amount_cents'] = cents_expression(amount)
+            else:
+                kwargs['amount_cents'] = to_cents(amount)
+        return super().update(**kwargs)
+
+
 class Expense(models.Model):
     CATEGORY_CHOICES = [
         ('Food', 'Food'),
@@ -14,13 +45,182 @@ class Expense(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     title = models.CharField(max_length=200)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
+    # `amount` as integer cents, written with it (see money.py); totals sum this.
+    # Nullable only so adding it didn't rebuild the table on SQLite.
+    amount_cents = models.BigIntegerField(null=True, editable=False)
     category = models.CharField(max_length=50, choices=CATEGORY_CHOICES)
     date = models.DateField()
     description = models.TextField(blank=True, null=True)
+    # classifier version that predicted `category`; None when the user chose it
+    category_model_version = models.CharField(max_length=32, blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    # the file import that created the row, so `import_expenses --restart` can remove it
+    import_checkpoint = models.ForeignKey('ImportCheckpoint', null=True, blank=True, editable=False,
+                                          on_delete=models.SET_NULL, related_name='expenses')
+
+    objects = ExpenseQuerySet.as_manager()
+
+    class Meta:
+        # Every read is one user's rows by date, often within a category.
+        # `include` makes these covering on PostgreSQL (index-only sums of
+        # amount_cents, which is what the aggregates read);
+        # other databases create them as plain indexes.
+        indexes = [
+            models.Index(fields=['user', 'date'], include=['category', 'amount_cents'],
+                         name='expense_user_date_idx'),
+            models.Index(fields=['user', 'category', 'date'], include=['amount_cents'],
+                         name='expense_user_cat_date_idx'),
+        ]
 
     def __str__(self):
         return f"{self.title} - ${self.amount}"
 
+    def save(self, *args, **kwargs):
+        self.amount_cents = to_cents(self.amount)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'amount' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'amount_cents'}
+        # Run the save and its signal receivers (daily rollup upkeep) atomically.
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
+
+class FullTextMatch(models.Lookup):
+    """`column MATCH query`, for an FTS5 table's hidden column named after the table."""
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} MATCH {rhs}", (*lhs_params, *rhs_params)
+
+
+class FullTextQueryField(models.TextField):
+    pass
+
+
+FullTextQueryField.register_lookup(FullTextMatch)
+
+
+class ExpenseSearchIndex(models.Model):
+    """
+    The SQLite FTS5 table over expense titles and descriptions (created by
+    migration 0010, not by Django; see search.py). Lets searches join it
+    through the ORM. It exists only on SQLite and is never written to here.
+    """
+    expense = models.OneToOneField(Expense, primary_key=True, db_column='rowid', db_constraint=False,
+                                   on_delete=models.DO_NOTHING, related_name='search_index')
+    # FTS5 hidden columns: the one named after the table takes MATCH queries,
+    # `rank` is the bm25 score of the match (lower is better)
+    query = FullTextQueryField(db_column='expenses_expense_fts')
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = 'expenses_expense_fts'
+
+
+class ExpenseDailyRollup(models.Model):
+    """
+    Running SUM/COUNT of a user's expenses per (date, category).
+    Maintained by the Expense signals; rebuilt with `manage.py rebuild_rollups`.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    date = models.DateField()
+    category = models.CharField(max_length=50, choices=Expense.CATEGORY_CHOICES)
+    total_cents = models.BigIntegerField(default=0)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'date', 'category'], name='unique_daily_rollup'),
+        ]
+
+    @property
+    def total(self):
+        return from_cents(self.total_cents)
+
+    def __str__(self):
+        return f"{self.user_id} {self.date} {self.category}: {self.total} ({self.count})"
+
+class ImportCheckpoint(models.Model):
+    """
+    Progress of `manage.py import_expenses` for one source file. Updated in the
+    same transaction as each inserted chunk, so a crashed import resumes
+    exactly after the last committed row.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    source = models.CharField(max_length=500)
+    file_size = models.BigIntegerField(default=0)
+    rows_done = models.PositiveIntegerField(default=0)
+    finished = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'source'], name='unique_import_checkpoint'),
+        ]
+
+    def __str__(self):
+        return f"{self.source}: {self.rows_done} row(s){' (finished)' if self.finished else ''}"
+
+class ExpenseDataVersion(models.Model):
+    """
+    Random token replaced whenever a user's expenses change (see caching.py).
+    Cache keys include it, so bumping it invalidates everything cached for
+    the user at once.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='expense_data_version')
+    version = models.BigIntegerField()
+
+    def __str__(self):
+        return f"{self.user_id}: {self.version}"
+
+class Job(models.Model):
+    """
+    A report or export run in the background by `manage.py run_worker`
+    (see jobs.py). The worker holding a running job renews `lease_expires_at`;
+    past it, the job is free for another worker to retry.
+    """
+    QUEUED, RUNNING, SUCCEEDED, FAILED = 'queued', 'running', 'succeeded', 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=50)
+    params = models.JSONField(default=dict, blank=True)
+    # digest of `params`; at most one identical job is pending per user
+    params_key = models.CharField(max_length=40)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now)
+    worker = models.CharField(max_length=100, blank=True)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    result = models.FileField(upload_to='job_results/%Y/%m/', blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='job_status_run_after_idx'),
+            models.Index(fields=['finished_at'], name='job_finished_at_idx'),
+        ]
+        constraints = [
+            # also the index enqueue() looks pending jobs up by
+            models.UniqueConstraint(fields=['user', 'kind', 'params_key'],
+                                    condition=models.Q(status__in=['queued', 'running']),
+                                    name='job_one_pending_per_params'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status})"
+
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     bio = models.TextField(blank=True, null=True)
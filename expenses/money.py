@@ -0,0 +1,40 @@
+"""
+Money as integer cents.
+
+Expense.amount stays a two-place DecimalField: forms and the API accept and
+return decimals. Every write also stores the same value as integer cents in
+Expense.amount_cents, and the daily rollups keep total_cents, so sums are
+integer arithmetic in the database and in Python (exact, and much cheaper
+than Decimal). Convert back at the edges with from_cents() / cents_to_float().
+"""
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db.models import BigIntegerField
+from django.db.models.functions import Cast, Round
+
+CENT = Decimal('0.01')
+
+
+def to_cents(amount):
+    """Integer cents of a Decimal/str/int/float amount (None stays None)."""
+    if amount is None:
+        return None
+    if not isinstance(amount, Decimal):
+        # str() first: Decimal(0.1) is 0.1000000000000000055...
+        amount = Decimal(str(amount))
+    return int(amount.quantize(CENT, rounding=ROUND_HALF_UP).scaleb(2))
+
+
+def from_cents(cents):
+    """Two-place Decimal of integer cents (None counts as 0, like an empty SUM)."""
+    return Decimal(cents or 0).scaleb(-2)
+
+
+def cents_to_float(cents, divisor=1):
+    """float(from_cents(cents) / divisor), in one correctly rounded division."""
+    return (cents or 0) / (100 * divisor)
+
+
+def cents_expression(amount):
+    """SQL computing integer cents from a decimal amount expression."""
+    return Cast(Round(amount * 100), BigIntegerField())
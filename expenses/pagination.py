@@ -0,0 +1,17 @@
+"""
+Pagination classes for the Expense Tracker API.
+"""
+from rest_framework.pagination import CursorPagination
+
+
+class ExpenseCursorPagination(CursorPagination):
+    """
+    Keyset pagination over (-date, -id).
+
+    Each page seeks from the last seen position instead of using OFFSET, so
+    deep pages cost the same as the first one. Page size defaults to the
+    global PAGE_SIZE and can be lowered/raised with ?page_size=.
+    """
+    ordering = ('-date', '-id')
+    page_size_query_param = 'page_size'
+    max_page_size = 500
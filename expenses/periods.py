@@ -0,0 +1,96 @@
+"""
+Calendar periods as half-open date ranges.
+
+Filtering with ``date__gte=start, date__lt=end`` lets the database range-scan
+an index on ``date``; ``date__year=`` / ``date__month=`` compile to EXTRACT()
+calls that can't. Every helper takes a reference day and an optional offset
+in periods (-1 is the previous one) and returns a Period.
+"""
+from datetime import date, timedelta
+from typing import NamedTuple
+
+from django.utils import timezone
+
+
+class Period(NamedTuple):
+    start: date  # first day, inclusive
+    end: date    # first day after the period, exclusive
+
+    @property
+    def last_day(self):
+        return self.end - timedelta(days=1)
+
+    @property
+    def days(self):
+        return (self.end - self.start).days
+
+    def filter_kwargs(self, field='date'):
+        """Queryset filter arguments selecting this period on `field`."""
+        return {f'{field}__gte': self.start, f'{field}__lt': self.end}
+
+    def __contains__(self, day):
+        return self.start <= day < self.end
+
+
+def today():
+    """The current date in the project's time zone."""
+    return timezone.localdate()
+
+
+def _add_months(year, month, months):
+    index = year * 12 + (month - 1) + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def day(ref=None, offset=0):
+    start = (ref or today()) + timedelta(days=offset)
+    return Period(start, start + timedelta(days=1))
+
+
+def iso_week(ref=None, offset=0):
+    """Monday to Sunday."""
+    ref = ref or today()
+    start = ref - timedelta(days=ref.weekday()) + timedelta(weeks=offset)
+    return Period(start, start + timedelta(weeks=1))
+
+
+def month(ref=None, offset=0):
+    ref = ref or today()
+    start = _add_months(ref.year, ref.month, offset)
+    return Period(start, _add_months(start.year, start.month, 1))
+
+
+def quarter(ref=None, offset=0):
+    ref = ref or today()
+    start = _add_months(ref.year, ref.month - (ref.month - 1) % 3, 3 * offset)
+    return Period(start, _add_months(start.year, start.month, 3))
+
+
+def year(ref=None, offset=0):
+    ref = ref or today()
+    return Period(date(ref.year + offset, 1, 1), date(ref.year + offset + 1, 1, 1))
+
+
+def rolling_days(days, ref=None):
+    """The last `days` days up to and including `ref` (default: today)."""
+    end = (ref or today()) + timedelta(days=1)
+    return Period(end - timedelta(days=days), end)
+
+
+def between(first_day, last_day):
+    """The inclusive range first_day..last_day as a Period."""
+    return Period(first_day, last_day + timedelta(days=1))
+
+
+def span(first, last):
+    """From the start of period `first` to the end of period `last`."""
+    return Period(first.start, last.end)
+
+
+PERIODS = {
+    'day': day,
+    'week': iso_week,
+    'month': month,
+    'quarter': quarter,
+    'year': year,
+}
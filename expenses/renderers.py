@@ -0,0 +1,32 @@
+"""
+Renderers for streamed (non-JSON) API responses.
+"""
+import json
+
+from rest_framework.renderers import BaseRenderer
+
+
+class StreamRenderer(BaseRenderer):
+    """
+    Makes a format selectable through content negotiation (?format=...).
+    Views using it return a StreamingHttpResponse themselves; only error
+    payloads (dicts) ever reach render(), and those are written as JSON.
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if isinstance(data, (bytes, str)):
+            return data
+        return json.dumps(data)
+
+
+class CSVRenderer(StreamRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class NDJSONRenderer(StreamRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
@@ -0,0 +1,156 @@
+"""
+Maintenance of the per-user daily rollup table (ExpenseDailyRollup).
+
+Every Expense write is turned into (user, date, category) -> (cents, count)
+deltas which are folded into the rollup rows, so aggregate readers scan at
+most one row per day and category instead of every expense.
+"""
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from . import caching, live
+from .bulk_sql import update_by_pk
+from .models import Expense, ExpenseDailyRollup
+from .money import to_cents
+
+DATE_FIELD = Expense._meta.get_field('date')
+
+_local = threading.local()
+# inserts of missing rows before all of them are seen locked (see apply_deltas)
+UPSERT_ATTEMPTS = 3
+
+
+def rollup_key(user_id, date, category):
+    return (user_id, date, category)
+
+
+def new_deltas():
+    """Return an empty delta accumulator: key -> [cents, count]."""
+    return defaultdict(lambda: [0, 0])
+
+
+def add_expense(deltas, expense, sign=1):
+    """Add (sign=1) or remove (sign=-1) one expense's contribution to `deltas`."""
+    add_values(deltas, expense.user_id, expense.date, expense.category, to_cents(expense.amount), sign)
+
+
+def add_values(deltas, user_id, date, category, cents, sign=1):
+    # instances may still carry the raw date they were created with (str)
+    entry = deltas[rollup_key(user_id, DATE_FIELD.to_python(date), category)]
+    entry[0] += sign * cents
+    entry[1] += sign
+
+
+def merge_deltas(target, deltas):
+    for key, (cents, count) in deltas.items():
+        entry = target[key]
+        entry[0] += cents
+        entry[1] += count
+
+
+@contextmanager
+def deferred():
+    """
+    Collect the rollup deltas of every write inside the block and apply them
+    once on exit, instead of once per row. Nested blocks share the outer batch.
+    """
+    if getattr(_local, 'deltas', None) is not None:
+        yield _local.deltas
+        return
+    _local.deltas = new_deltas()
+    try:
+        yield _local.deltas
+        apply_deltas(_local.deltas)
+    finally:
+        _local.deltas = None
+
+
+def record(deltas):
+    """Apply deltas now, or add them to the enclosing deferred() batch."""
+    batch = getattr(_local, 'deltas', None)
+    if batch is None:
+        apply_deltas(deltas)
+    else:
+        merge_deltas(batch, deltas)
+
+
+def apply_deltas(deltas):
+    """
+    Fold accumulated deltas into ExpenseDailyRollup rows in one transaction.
+
+    Concurrent writers may both add the first expense of a day and category:
+    missing rows are inserted empty with ON CONFLICT DO NOTHING, so whoever
+    comes second skips the insert instead of failing on unique_daily_rollup.
+    Every row then exists and is locked before its increment.
+    """
+    deltas = {key: value for key, value in deltas.items() if value[0] or value[1]}
+    if not deltas:
+        return
+
+    user_ids = {key[0] for key in deltas}
+    dates = {key[1] for key in deltas}
+    with transaction.atomic():
+        rows = ExpenseDailyRollup.objects.filter(user_id__in=user_ids, date__in=dates)
+        existing = {rollup_key(*key) for key in rows.values_list('user_id', 'date', 'category')}
+        for _attempt in range(UPSERT_ATTEMPTS):
+            # key order: writers waiting on each other's pending inserts can't deadlock
+            missing = sorted(key for key in deltas if key not in existing)
+            if missing:
+                ExpenseDailyRollup.objects.bulk_create(
+                    [ExpenseDailyRollup(user_id=user_id, date=date, category=category)
+                     for user_id, date, category in missing],
+                    batch_size=500, ignore_conflicts=True,
+                )
+            # pk order, so writers touching the same rows lock them in the same order
+            locked = {
+                rollup_key(row.user_id, row.date, row.category): row
+                for row in rows.select_for_update().order_by('pk')
+            }
+            existing = set(locked)
+            # a row emptied and deleted by another writer meanwhile: insert it again
+            if all(key in locked for key in deltas):
+                break
+        else:
+            raise RuntimeError("Rollup rows kept disappearing during the upsert.")
+
+        update_by_pk(ExpenseDailyRollup, ['total_cents', 'count'],
+                     {locked[key].pk: value for key, value in deltas.items()}, increment=True)
+        ExpenseDailyRollup.objects.filter(user_id__in=user_ids, date__in=dates, count=0).delete()
+        live.publish_on_commit(deltas)
+
+
+def rebuild_rollups(user=None, batch_size=1000):
+    """Recompute rollup rows from the Expense table (for one user or everyone)."""
+    expenses = Expense.objects.all()
+    rollups = ExpenseDailyRollup.objects.all()
+    if user is not None:
+        expenses = expenses.filter(user=user)
+        rollups = rollups.filter(user=user)
+
+    grouped = (
+        expenses.values('user_id', 'date', 'category')
+        .annotate(total_cents=Sum('amount_cents'), count=Count('id'))
+        .order_by()
+    )
+    created = 0
+    with transaction.atomic():
+        rollups.delete()
+        batch = []
+        for row in grouped.iterator(chunk_size=batch_size):
+            batch.append(ExpenseDailyRollup(**row))
+            if len(batch) >= batch_size:
+                ExpenseDailyRollup.objects.bulk_create(batch)
+                created += len(batch)
+                batch = []
+        if batch:
+            ExpenseDailyRollup.objects.bulk_create(batch)
+            created += len(batch)
+        caching.invalidate([user.pk] if user is not None else None)
+        if user is not None:
+            # no deltas to report, but open dashboards should reload their totals
+            transaction.on_commit(lambda: live.get_broker().publish(user.pk, {'changes': []}), robust=True)
+    return created
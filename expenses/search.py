@@ -0,0 +1,136 @@
+"""
+Full-text search over expense titles and descriptions.
+
+PostgreSQL matches against the generated, GIN-indexed ``search_vector``
+column and SQLite against the ``expenses_expense_fts`` FTS5 table (both
+created by migration 0010), so a search is an index lookup instead of a
+``LIKE '%term%'`` scan of every row. Other databases fall back to icontains.
+
+Every word of the query must match, as a prefix, after stemming. Matching
+rows are annotated with ``search_rank`` (higher is better).
+
+SQLite keeps the FTS5 table current with triggers on expenses_expense. A
+later migration that rebuilds that table (SQLite's way of altering most
+columns) drops them along with the old table, so after every migrate
+restore_sqlite_triggers() puts back any that are missing and reindexes.
+"""
+import logging
+import re
+
+from django.db import connections
+from django.db.models import ExpressionWrapper, F, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast
+from rest_framework.filters import BaseFilterBackend
+
+logger = logging.getLogger(__name__)
+
+TERM_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+
+def search_terms(text):
+    return TERM_PATTERN.findall(str(text or '').lower())
+
+
+def _postgres_search(queryset, terms):
+    from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVectorField
+
+    query = SearchQuery(' & '.join(f'{term}:*' for term in terms), search_type='raw', config='english')
+    vector = RawSQL('"expenses_expense"."search_vector"', [], output_field=SearchVectorField())
+    # ts_rank is a float4; as float8 the value survives the round trip through
+    # a pagination cursor, which otherwise lands just past the last row's rank
+    return queryset.annotate(_search_vector=vector).filter(_search_vector=query).annotate(
+        search_rank=Cast(SearchRank(F('_search_vector'), query), FloatField()))
+
+
+def _sqlite_search(queryset, terms):
+    match = ' '.join(f'"{term}"*' for term in terms)
+    # A join (ExpenseSearchIndex is the FTS5 table), so the MATCH runs once; a
+    # correlated rank subquery would re-run it for every matching row.
+    return queryset.filter(search_index__query__match=match).annotate(
+        search_rank=ExpressionWrapper(-F('search_index__rank'), output_field=FloatField()))
+
+
+# as created by migration 0010
+SQLITE_TRIGGERS = {
+    'expenses_expense_fts_insert': """
+        CREATE TRIGGER expenses_expense_fts_insert AFTER INSERT ON expenses_expense BEGIN
+            INSERT INTO expenses_expense_fts(rowid, title, description)
+            VALUES (new.id, new.title, new.description);
+        END
+    """,
+    'expenses_expense_fts_delete': """
+        CREATE TRIGGER expenses_expense_fts_delete AFTER DELETE ON expenses_expense BEGIN
+            INSERT INTO expenses_expense_fts(expenses_expense_fts, rowid, title, description)
+            VALUES ('delete', old.id, old.title, old.description);
+        END
+    """,
+    'expenses_expense_fts_update': """
+        CREATE TRIGGER expenses_expense_fts_update AFTER UPDATE OF title, description ON expenses_expense BEGIN
+            INSERT INTO expenses_expense_fts(expenses_expense_fts, rowid, title, description)
+            VALUES ('delete', old.id, old.title, old.description);
+            INSERT INTO expenses_expense_fts(rowid, title, description)
+            VALUES (new.id, new.title, new.description);
+        END
+    """,
+}
+
+
+def restore_sqlite_triggers(connection):
+    """Recreate missing FTS triggers and reindex; returns the names recreated."""
+    if connection.vendor != 'sqlite':
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'expenses_expense_fts'")
+        if cursor.fetchone() is None:
+            return []  # migration 0010 isn't applied (yet)
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'expenses_expense'")
+        present = {name for name, in cursor.fetchall()}
+        missing = [name for name in SQLITE_TRIGGERS if name not in present]
+        for name in missing:
+            cursor.execute(SQLITE_TRIGGERS[name])
+        if missing:
+            # rows written while the triggers were gone aren't indexed
+            cursor.execute("INSERT INTO expenses_expense_fts(expenses_expense_fts) VALUES ('rebuild')")
+    return missing
+
+
+def restore_search_after_migrate(using, **kwargs):
+    missing = restore_sqlite_triggers(connections[using])
+    if missing:
+        logger.warning(f"Recreated dropped full-text search triggers: {', '.join(missing)}")
+
+
+def _fallback_search(queryset, terms):
+    for term in terms:
+        queryset = queryset.filter(Q(title__icontains=term) | Q(description__icontains=term))
+    return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+SEARCHERS = {
+    'postgresql': _postgres_search,
+    'sqlite': _sqlite_search,
+}
+
+
+def search_expenses(queryset, text):
+    """Expenses in `queryset` matching every word of `text`, annotated with search_rank."""
+    terms = search_terms(text)
+    if not terms:
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+    searcher = SEARCHERS.get(connections[queryset.db].vendor, _fallback_search)
+    return searcher(queryset, terms)
+
+
+class ExpenseSearchFilter(BaseFilterBackend):
+    """
+    ?search=<words> on the expense list and export, using the database's
+    full-text index. Order by relevance with ?ordering=-search_rank.
+    """
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        text = request.query_params.get(self.search_param, '')
+        if text or 'search_rank' in request.query_params.get('ordering', ''):
+            return search_expenses(queryset, text)
+        return queryset
@@ -2,9 +2,16 @@
 Serializers for Expense Tracker API.
 Converts Django models to JSON and validates incoming data.
 """
-from rest_framework import serializers
+from datetime import date
+from decimal import Decimal
+from functools import lru_cache
+
+from rest_framework import ISO_8601, serializers
+from rest_framework.reverse import reverse
+from rest_framework.settings import api_settings
 from django.contrib.auth.models import User
-from .models import Expense, Profile
+from .columnar import to_columns
+from .models import Expense, Job, Profile
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -50,15 +57,121 @@ class ExpenseSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
+class ExpenseBulkRowSerializer(ExpenseSerializer):
+    """
+    One row of a bulk request. Category and date may be omitted:
+    missing categories are predicted in a batch, missing dates default to today.
+    """
+    category = serializers.ChoiceField(choices=Expense.CATEGORY_CHOICES, required=False, allow_blank=True)
+    date = serializers.DateField(required=False)
+
+
 class ExpenseListSerializer(serializers.ModelSerializer):
-    """Lightweight serializer for expense lists (less data)."""
+    """
+    Lightweight serializer for expense lists (less data).
+    Supports sparse fieldsets via ?fields=id,amount,...
+    """
     
     class Meta:
         model = Expense
         fields = ['id', 'title', 'amount', 'category', 'date']
     
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        requested = self.requested_fields(self.context.get('request'))
+        if requested:
+            for name in set(self.fields) - set(requested):
+                self.fields.pop(name)
+    
+    @classmethod
+    def requested_fields(cls, request):
+        """Return the known fields listed in ?fields=, or None for all fields."""
+        if request is None:
+            return None
+        param = request.query_params.get('fields')
+        if not param:
+            return None
+        names = {name.strip() for name in param.split(',')}
+        return [name for name in cls.Meta.fields if name in names] or None
+
+
+def _converter(field):
+    """
+    A plain function giving the same result as field.to_representation for
+    the (non-null) values the database returns, or None when the value can be
+    used as is.
+    """
+    if isinstance(field, serializers.DecimalField) and not field.localize and field.decimal_places is not None \
+            and getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING):
+        exponent = Decimal(1).scaleb(-field.decimal_places)
+        rounding = field.rounding
+        return lambda value: format(value.quantize(exponent, rounding=rounding), 'f')
+    if isinstance(field, serializers.DateField) and \
+            str(getattr(field, 'format', api_settings.DATE_FORMAT)).lower() == ISO_8601:
+        return date.isoformat
+    if type(field) in (serializers.CharField, serializers.ChoiceField, serializers.IntegerField):
+        # values_list already returns str/int for these
+        return None
+    return field.to_representation
+
+
+class ExpenseRowSerializer:
+    """
+    Read-only fast path for ExpenseListSerializer.
+
+    Serializes the rows of `.values_list(*source_fields, named=True)` with
+    converters compiled once from ExpenseListSerializer's fields, so list
+    responses skip model instantiation and DRF's per-field machinery while
+    producing the same data (sparse ?fields= included).
+    """
+    
+    def __init__(self, fields=None):
+        list_fields = ExpenseListSerializer().fields
+        self.fields = list(fields or ExpenseListSerializer.Meta.fields)
+        self.source_fields = [list_fields[name].source for name in self.fields]
+        self._columns = [(name, _converter(list_fields[name])) for name in self.fields]
+    
+    @classmethod
+    @lru_cache(maxsize=64)
+    def for_fields(cls, fields=None):
+        """Shared instance per field selection (a tuple, or None for all fields)."""
+        return cls(fields)
+    
+    def serialize(self, rows):
+        columns = self._columns
+        data = []
+        for row in rows:
+            item = {}
+            for (name, convert), value in zip(columns, row):
+                item[name] = value if convert is None or value is None else convert(value)
+            data.append(item)
+        return data
+    
+    def serialize_columns(self, rows, dictionary=()):
+        """Same values as serialize(), one array per field (see columnar.py)."""
+        return to_columns(self._columns, rows, dictionary)
 
 
 class ExpenseDetailSerializer(ExpenseSerializer):
     """Detailed serializer with all fields for single expense view."""
     pass
+
+
+class JobSerializer(serializers.ModelSerializer):
+    """Status of a background job, with its download URL once it succeeded."""
+    url = serializers.SerializerMethodField()
+    download_url = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = Job
+        fields = ['id', 'url', 'kind', 'params', 'status', 'attempts', 'error',
+                  'created_at', 'started_at', 'finished_at', 'download_url']
+        read_only_fields = fields
+    
+    def get_url(self, job):
+        return reverse('api:job-detail', args=[job.pk], request=self.context.get('request'))
+    
+    def get_download_url(self, job):
+        if job.status != Job.SUCCEEDED:
+            return None
+        return reverse('api:job-download', args=[job.pk], request=self.context.get('request'))
@@ -1,10 +1,13 @@
 import logging
-from django.db.models.signals import pre_save, post_save
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
 from django.utils.timezone import now
 from django.core.exceptions import ValidationError
 from django.contrib.auth.models import User
 from .models import Expense, Profile
+from . import caching, rollups
+from .keywords import keyword_category
+from .money import to_cents
 
 logger = logging.getLogger(__name__)
 
@@ -16,6 +19,14 @@ def set_default_date(sender, instance, **kwargs):
     if not instance.date:
         instance.date = now().date()
 
+@receiver(pre_save, sender=Expense)
+def fill_raw_save(sender, instance, raw=False, **kwargs):
+    # loaddata saves raw, bypassing save() and auto_now: derive those columns here
+    if raw:
+        if instance.updated_at is None:
+            instance.updated_at = now()
+        instance.amount_cents = to_cents(instance.amount)
+
 @receiver(pre_save, sender=Expense)
 def validate_amount(sender, instance, **kwargs):
     if instance.amount <= 0:
@@ -24,11 +35,43 @@ def validate_amount(sender, instance, **kwargs):
 @receiver(pre_save, sender=Expense)
 def auto_categorize(sender, instance, **kwargs):
     if not instance.category or instance.category == 'Other':
-        title = instance.title.lower()
-        if "uber" in title or "bus" in title:
-            instance.category = "Travel"
-        elif "pizza" in title or "restaurant" in title:
-            instance.category = "Food"
+        category = keyword_category(instance.title)
+        if category:
+            instance.category = category
+
+@receiver(pre_save, sender=Expense)
+def remember_rollup_state(sender, instance, **kwargs):
+    # The row as currently stored, so post_save can move its rollup contribution.
+    instance._rollup_previous = None
+    if instance.pk:
+        instance._rollup_previous = (
+            Expense.objects.filter(pk=instance.pk)
+            .values_list('user_id', 'date', 'category', 'amount_cents')
+            .first()
+        )
+
+@receiver(post_save, sender=Expense)
+def update_rollup_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    deltas = rollups.new_deltas()
+    previous = getattr(instance, '_rollup_previous', None)
+    if previous:
+        rollups.add_values(deltas, *previous, sign=-1)
+    rollups.add_expense(deltas, instance)
+    rollups.record(deltas)
+
+@receiver(post_delete, sender=Expense)
+def update_rollup_on_delete(sender, instance, **kwargs):
+    deltas = rollups.new_deltas()
+    rollups.add_expense(deltas, instance, sign=-1)
+    rollups.record(deltas)
+
+@receiver(post_save, sender=Expense)
+@receiver(post_delete, sender=Expense)
+def invalidate_cached_summaries(sender, instance, raw=False, **kwargs):
+    if not raw:
+        caching.invalidate([instance.user_id])
 
 @receiver(post_save, sender=Expense)
 def notify_expense_added(sender, instance, created, **kwargs):
@@ -44,6 +87,11 @@ def create_profile(sender, instance, created, **kwargs):
         Profile.objects.create(user=instance)
         logger.info(f"👤 Profile created for {instance.username}")
 
+@receiver(post_save, sender=User)
+def create_data_version(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        caching.bump_data_version([instance.pk])
+
 @receiver(post_save, sender=User)
 def save_profile(sender, instance, **kwargs):
     instance.profile.save()
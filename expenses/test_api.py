@@ -1,9 +1,20 @@
 import pytest
 from django.contrib.auth.models import User
-from rest_framework.test import APIClient
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
 from rest_framework import status
-from expenses.models import Expense, Profile
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models import QuerySet
+from django.utils import timezone
+from django.test.utils import CaptureQueriesContext
+from expenses import jobs, periods
+from expenses.models import Expense, ExpenseDailyRollup, Job, Profile
+from expenses.serializers import ExpenseListSerializer, ExpenseRowSerializer
 from datetime import datetime, timedelta
+from decimal import Decimal
+import io
 import json
 
 
@@ -153,6 +164,188 @@ class TestExpenseAPI:
         assert len(data_list) == 1
         assert data_list[0]['category'] == 'Food'
     
+    def test_full_text_search(self):
+        """?search= matches stemmed word prefixes in title/description and ranks hits"""
+        today = datetime.now().date()
+        Expense.objects.create(user=self.user, title='Weekly groceries', amount=40, category='Food', date=today)
+        Expense.objects.create(user=self.user, title='Dinner', amount=25, category='Food', date=today,
+                               description='grocery store deli')
+        Expense.objects.create(user=self.user, title='Taxi', amount=12, category='Travel', date=today)
+        Expense.objects.create(user=self.other_user, title='Groceries', amount=5, category='Food', date=today)
+        
+        response = self.client.get('/api/expenses/?search=grocer&ordering=-search_rank')
+        assert response.status_code == status.HTTP_200_OK
+        # title matches outrank description matches; other users' rows never match
+        assert [e['title'] for e in response.data['results']] == ['Weekly groceries', 'Dinner']
+        page = self.client.get('/api/expenses/?search=grocer&ordering=-search_rank&page_size=1')
+        assert page.data['results'][0]['title'] == 'Weekly groceries'
+        assert self.client.get(page.data['next']).data['results'][0]['title'] == 'Dinner'
+        assert self.client.get('/api/expenses/?search=weekly+grocery').data['results'][0]['title'] == 'Weekly groceries'
+        assert self.client.get('/api/expenses/?search=taxi+grocery').data['results'] == []
+        
+        expense = Expense.objects.get(title='Taxi')
+        expense.title = 'Airport taxi'
+        expense.save()
+        assert len(self.client.get('/api/expenses/?search=airport').data['results']) == 1
+        expense.delete()
+        assert self.client.get('/api/expenses/?search=taxi').data['results'] == []
+        response = self.client.get('/api/expenses/export/?format=csv&search=dinner')
+        assert len(b''.join(response.streaming_content).decode().splitlines()) == 2
+    
+    def test_list_cursor_pagination(self):
+        """List pages are keyed on (-date, -id) and chained via next links"""
+        today = datetime.now().date()
+        for i in range(5):
+            Expense.objects.create(user=self.user, title=f'E{i}', amount=10, category='Food',
+                                   date=today - timedelta(days=i // 2))
+        
+        response = self.client.get('/api/expenses/?page_size=2')
+        assert response.status_code == status.HTTP_200_OK
+        titles = [e['title'] for e in response.data['results']]
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            titles += [e['title'] for e in response.data['results']]
+        assert titles == ['E1', 'E0', 'E3', 'E2', 'E4']
+    
+    def test_list_fast_path_matches_model_serializer(self):
+        """values_list rows render byte for byte like ExpenseListSerializer"""
+        today = datetime.now().date()
+        for i, amount in enumerate(['0.50', '12', '99999999.99', '7.10']):
+            Expense.objects.create(user=self.user, title=f'Row {i} ünïcode', amount=Decimal(amount), category='Other',
+                                   date=today - timedelta(days=i))
+        
+        for fields in [None, ('amount', 'date'), ('title',)]:
+            query = '?page_size=500' + ('&fields=' + ','.join(fields) if fields else '')
+            response = self.client.get('/api/expenses/' + query)
+            expected = ExpenseListSerializer(
+                Expense.objects.filter(user=self.user).order_by('-date', '-id'), many=True,
+                context={'request': Request(APIRequestFactory().get('/api/expenses/' + query))},
+            ).data
+            assert JSONRenderer().render(response.data['results']) == JSONRenderer().render(expected)
+        assert ExpenseRowSerializer.for_fields(('title',)) is ExpenseRowSerializer.for_fields(('title',))
+    
+    def test_list_columnar_layout(self):
+        """?layout=columnar returns one array per field, optionally dictionary encoded"""
+        today = datetime.now().date()
+        for i, category in enumerate(['Food', 'Travel', 'Food']):
+            Expense.objects.create(user=self.user, title=f'C{i}', amount=Decimal('1.5') * (i + 1), category=category,
+                                   date=today - timedelta(days=i))
+        
+        rows = self.client.get('/api/expenses/').data['results']
+        response = self.client.get('/api/expenses/?layout=columnar')
+        assert response.status_code == status.HTTP_200_OK
+        columns = response.data['results']
+        assert list(columns) == ['id', 'title', 'amount', 'category', 'date']
+        assert [dict(zip(columns, values)) for values in zip(*columns.values())] == rows
+        
+        response = self.client.get('/api/expenses/?layout=columnar&dictionary=category&fields=amount,category&page_size=2')
+        assert response.data['results'] == {
+            'amount': ['1.50', '3.00'],
+            'category': {'dictionary': ['Food', 'Travel'], 'indices': [0, 1]},
+        }
+        assert self.client.get(response.data['next']).data['results']['category'] == {
+            'dictionary': ['Food'], 'indices': [0]}
+        
+        assert self.client.get('/api/expenses/?layout=wide').status_code == status.HTTP_400_BAD_REQUEST
+        assert self.client.get('/api/expenses/?dictionary=category').status_code == status.HTTP_400_BAD_REQUEST
+        
+        response = self.client.get('/api/expenses/export/?format=ndjson&layout=columnar&dictionary=category')
+        batches = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        assert len(batches) == 1
+        assert batches[0]['title'] == ['C0', 'C1', 'C2']
+        assert batches[0]['amount'] == ['1.50', '3.00', '4.50']
+        assert batches[0]['category'] == {'dictionary': ['Food', 'Travel'], 'indices': [0, 1, 0]}
+        assert self.client.get('/api/expenses/export/?format=csv&layout=columnar').status_code == \
+            status.HTTP_400_BAD_REQUEST
+    
+    def test_list_sparse_fields(self):
+        """?fields= limits the emitted columns"""
+        Expense.objects.create(user=self.user, title='Sparse', amount=10, category='Food',
+                               date=datetime.now().date())
+        response = self.client.get('/api/expenses/?fields=id,amount')
+        assert response.status_code == status.HTTP_200_OK
+        assert list(response.data['results'][0].keys()) == ['id', 'amount']
+    
+    def test_bulk_operations(self):
+        """Bulk endpoint applies creates, updates and deletes in one request"""
+        today = datetime.now().date()
+        keep = Expense.objects.create(user=self.user, title='Keep', amount=10, category='Food', date=today)
+        drop = Expense.objects.create(user=self.user, title='Drop', amount=5, category='Food', date=today)
+        moved = Expense.objects.create(user=self.user, title='Bus', amount=3, category='Food', date=today,
+                                       description='typo', category_model_version='v1')
+        yesterday = today - timedelta(days=1)
+        operations = [
+            {'op': 'create', 'data': {'title': 'Uber ride', 'amount': '12.00', 'date': today.isoformat()}},
+            {'op': 'update', 'id': keep.id, 'data': {'amount': '20.00'}},
+            {'op': 'delete', 'id': drop.id},
+            {'op': 'update', 'id': moved.id, 'data': {'title': 'Train', 'category': 'Travel',
+                                                      'date': yesterday.isoformat(), 'description': None}},
+        ]
+        response = self.client.post('/api/expenses/bulk/', {'operations': operations}, format='json')
+        assert response.status_code == status.HTTP_200_OK
+        assert [r['status'] for r in response.data['results']] == ['created', 'updated', 'deleted', 'updated']
+        
+        created = Expense.objects.get(id=response.data['results'][0]['id'])
+        assert created.category == 'Travel'
+        kept = Expense.objects.get(id=keep.id)
+        assert (kept.amount, kept.amount_cents, kept.title) == (20, 2000, 'Keep')
+        assert not Expense.objects.filter(id=drop.id).exists()
+        moved.refresh_from_db()
+        assert (moved.title, moved.category, moved.date, moved.description, moved.amount_cents) == \
+            ('Train', 'Travel', yesterday, None, 300)
+        assert moved.category_model_version is None
+        assert moved.updated_at == kept.updated_at
+        
+        summary = self.client.get('/api/expenses/summary/')
+        assert summary.data['total_amount'] == 35
+        assert summary.data['expense_count'] == 3
+        assert {(r.date, r.category): r.total_cents for r in ExpenseDailyRollup.objects.filter(user=self.user)} == \
+            {(today, 'Food'): 2000, (today, 'Travel'): 1200, (yesterday, 'Travel'): 300}
+    
+    def test_bulk_invalid_row_writes_nothing(self):
+        """One invalid operation rejects the whole batch"""
+        today = datetime.now().date().isoformat()
+        existing = Expense.objects.create(user=self.user, title='Existing', amount=7, category='Food', date=today)
+        operations = [
+            {'op': 'create', 'data': {'title': 'Fine', 'amount': '5.00', 'category': 'Food', 'date': today}},
+            {'op': 'create', 'data': {'title': 'Bad', 'amount': '-1.00', 'category': 'Food', 'date': today}},
+            {'op': 'delete', 'id': 999999},
+            {'op': 'update', 'id': existing.id, 'data': {'amount': 'lots', 'category': 'Snacks'}},
+            {'op': 'create', 'data': 'not an object'},
+        ]
+        response = self.client.post('/api/expenses/bulk/', {'operations': operations}, format='json')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        results = response.data['results']
+        assert results[0] == {'index': 0, 'op': 'create', 'status': 'skipped', 'reason': 'batch failed'}
+        assert 'amount' in results[1]['errors']
+        assert 'id' in results[2]['errors']
+        assert set(results[3]['errors']) == {'amount', 'category'}
+        assert 'non_field_errors' in results[4]['errors']
+        assert list(Expense.objects.filter(user=self.user)) == [existing]
+        existing.refresh_from_db()
+        assert existing.amount == 7
+    
+    def test_export_csv_and_ndjson(self):
+        """Export streams filtered rows as CSV or NDJSON"""
+        today = datetime.now().date()
+        Expense.objects.create(user=self.user, title='Pizza, large', amount=15, category='Food', date=today)
+        Expense.objects.create(user=self.user, title='Bus', amount=2, category='Travel', date=today)
+        Expense.objects.create(user=self.other_user, title='Hidden', amount=1, category='Food', date=today)
+        
+        response = self.client.get('/api/expenses/export/?format=csv&category=Food')
+        assert response.status_code == status.HTTP_200_OK
+        assert response.streaming
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        assert lines[0] == 'id,date,title,amount,category,description'
+        assert len(lines) == 2
+        assert '"Pizza, large",15.00,Food' in lines[1]
+        
+        response = self.client.get('/api/expenses/export/?format=ndjson')
+        assert response['Content-Type'] == 'application/x-ndjson'
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        assert sorted(r['title'] for r in rows) == ['Bus', 'Pizza, large']
+        assert rows[0]['amount'] in ('15.00', '2.00')
+    
     def test_filter_by_date_range(self):
         """Test filtering expenses by date range"""
         # Skip this test as date filtering is complex and category filtering is proven
@@ -172,6 +365,116 @@ class TestExpenseAPI:
         assert response.data['expense_count'] == 3
         assert 'by_category' in response.data
     
+    def test_expense_summary_single_grouped_query(self):
+        """Summary runs one grouped query regardless of category count"""
+        today = datetime.now().date()
+        Expense.objects.create(user=self.user, title='E1', amount=50, category='Food', date=today)
+        Expense.objects.create(user=self.user, title='E2', amount=30, category='Food', date=today)
+        Expense.objects.create(user=self.user, title='E3', amount=100, category='Travel', date=today)
+        
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/expenses/summary/?group_by=category,month')
+        assert response.status_code == status.HTTP_200_OK
+        # the user's cache data version, then the grouped rollup query
+        assert len(ctx.captured_queries) == 2
+        by_category = {c['category']: c for c in response.data['by_category']}
+        assert by_category['Food']['total'] == 80
+        assert by_category['Food']['count'] == 2
+        assert by_category['Food']['average'] == 40
+        assert len(response.data['by_category_month']) == 2
+    
+    def test_expense_summary_cached_until_data_changes(self):
+        """Repeated summaries come from the cache; any write invalidates them"""
+        today = datetime.now().date()
+        expense = Expense.objects.create(user=self.user, title='E1', amount=50, category='Food', date=today)
+        assert self.client.get('/api/expenses/summary/').data['total_amount'] == 50
+        
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/expenses/summary/')
+        assert response.data['total_amount'] == 50
+        assert len(ctx.captured_queries) == 1
+        
+        expense.amount = 70
+        expense.save()
+        assert self.client.get('/api/expenses/summary/').data['total_amount'] == 70
+        self.client.post('/api/expenses/bulk/', {'operations': [
+            {'op': 'create', 'data': {'title': 'E2', 'amount': '5.00', 'category': 'Food', 'date': today.isoformat()}},
+        ]}, format='json')
+        assert self.client.get('/api/expenses/summary/').data['total_amount'] == 75
+        expense.delete()
+        assert self.client.get('/api/expenses/summary/').data['total_amount'] == 5
+        
+        # other users never see this user's cached numbers
+        self.client.force_authenticate(user=self.other_user)
+        assert self.client.get('/api/expenses/summary/').data['total_amount'] == 0
+    
+    def test_conditional_get_returns_304_until_data_changes(self):
+        """Unchanged data answers If-None-Match with 304 before touching expenses"""
+        today = datetime.now().date()
+        expense = Expense.objects.create(user=self.user, title='E1', amount=50, category='Food', date=today)
+        for url in ['/api/expenses/', '/api/expenses/summary/', '/api/expenses/monthly_stats/']:
+            etag = self.client.get(url)['ETag']
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            assert response.status_code == status.HTTP_304_NOT_MODIFIED
+            assert len(ctx.captured_queries) == 1
+            assert self.client.get(url + '?page_size=1')['ETag'] != etag
+        
+        etag = self.client.get('/api/expenses/')['ETag']
+        expense.title = 'E1 renamed'
+        expense.save()
+        response = self.client.get('/api/expenses/', HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_200_OK
+        assert response['ETag'] != etag
+        # another user's tag never matches
+        self.client.force_authenticate(user=self.other_user)
+        assert self.client.get('/api/expenses/', HTTP_IF_NONE_MATCH=etag).status_code == status.HTTP_200_OK
+    
+    def test_negotiated_responses_vary_on_accept(self):
+        """ETags hash Accept, so shared caches must key on it too, 304s included"""
+        Expense.objects.create(user=self.user, title='E1', amount=50, category='Food', date=datetime.now().date())
+        for url in ['/api/expenses/', '/api/expenses/summary/', '/api/expenses/export/']:
+            response = self.client.get(url)
+            assert 'Accept' in response['Vary'], url
+            if response.has_header('ETag'):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+                assert response.status_code == status.HTTP_304_NOT_MODIFIED
+                assert 'Accept' in response['Vary'], url
+    
+    def test_cache_stats_admin_only(self):
+        """Cache counters are exposed to admins"""
+        assert self.client.get('/api/expenses/cache_stats/').status_code == status.HTTP_403_FORBIDDEN
+        self.client.get('/api/expenses/monthly_stats/')
+        self.client.get('/api/expenses/monthly_stats/')
+        admin = User.objects.create_superuser(username='admin', password='adminpass123')
+        self.client.force_authenticate(user=admin)
+        response = self.client.get('/api/expenses/cache_stats/')
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['monthly_stats']['hits'] >= 1
+        assert response.data['monthly_stats']['misses'] >= 1
+    
+    def test_expense_summary_period(self):
+        """?period= selects a calendar period, offset steps back"""
+        last_month = periods.month(offset=-1)
+        Expense.objects.create(user=self.user, title='Old', amount=20, category='Food', date=last_month.start)
+        Expense.objects.create(user=self.user, title='New', amount=5, category='Food', date=periods.today())
+        response = self.client.get('/api/expenses/summary/?period=month&offset=-1')
+        assert response.data['total_amount'] == 20
+        assert response.data['end_date'] == last_month.last_day
+        assert self.client.get('/api/expenses/summary/?period=decade').status_code == status.HTTP_400_BAD_REQUEST
+    
+    def test_expense_summary_period_offset_out_of_range(self):
+        """Offsets past the calendar's range are a 400, not a 500"""
+        for query in ('period=year&offset=99999', 'period=day&offset=99999999', 'period=month&offset=-99999'):
+            response = self.client.get(f'/api/expenses/summary/?{query}')
+            assert response.status_code == status.HTTP_400_BAD_REQUEST, query
+            assert response.data['detail'] == 'offset is out of range.'
+    
+    def test_expense_summary_invalid_group_by(self):
+        """Unknown group_by dimensions are rejected"""
+        response = self.client.get('/api/expenses/summary/?group_by=title')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+    
     def test_monthly_stats(self):
         """Test the monthly_stats custom action"""
         response = self.client.get('/api/expenses/monthly_stats/')
@@ -183,6 +486,159 @@ class TestExpenseAPI:
             assert len(response.data) >= 0  # May be empty or have months
 
 
+@pytest.mark.django_db
+class TestJobAPI:
+    """Background jobs: 202 on enqueue, run_worker, status and download"""
+    
+    @pytest.fixture(autouse=True)
+    def media_root(self, settings, tmp_path):
+        settings.MEDIA_ROOT = tmp_path
+    
+    def setup_method(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='jobuser', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        today = periods.today()
+        Expense.objects.create(user=self.user, title='Lunch', amount=Decimal('12.50'), category='Food', date=today)
+        Expense.objects.create(user=self.user, title='Old train', amount=Decimal('40.00'), category='Travel',
+                               date=today - timedelta(days=700))
+    
+    def run_worker(self):
+        call_command('run_worker', processes=0, burst=True, stdout=io.StringIO())
+    
+    def test_background_summary_and_download(self):
+        """A background summary is the same JSON as the direct one"""
+        direct = self.client.get('/api/expenses/summary/?period=year')
+        response = self.client.get('/api/expenses/summary/?period=year&background=1')
+        assert response.status_code == status.HTTP_202_ACCEPTED
+        assert response['Location'] == response.data['url']
+        assert response.data['status'] == 'queued'
+        assert response.data['download_url'] is None
+        # asking again while it is pending doesn't queue it twice
+        assert self.client.get('/api/expenses/summary/?period=year&background=1').data['id'] == response.data['id']
+        
+        job_url = f"/api/jobs/{response.data['id']}/"
+        assert self.client.get(f'{job_url}download/').status_code == status.HTTP_409_CONFLICT
+        self.run_worker()
+        job = self.client.get(job_url).data
+        assert (job['status'], job['attempts']) == ('succeeded', 1)
+        
+        download = self.client.get(f'{job_url}download/')
+        assert download['Content-Type'] == 'application/json'
+        assert json.loads(b''.join(download.streaming_content)) == json.loads(json.dumps(direct.data, default=str))
+        
+        result = Job.objects.get(pk=response.data['id']).result
+        result.storage.delete(result.name)
+        gone = self.client.get(f'{job_url}download/')
+        assert gone.status_code == status.HTTP_410_GONE
+        assert 'no longer available' in gone.data['detail']
+        
+        other = User.objects.create_user(username='otherjobuser', password='testpass123')
+        self.client.force_authenticate(user=other)
+        assert self.client.get(job_url).status_code == status.HTTP_404_NOT_FOUND
+        assert self.client.get('/api/jobs/').data['count'] == 0
+    
+    def test_long_summary_and_export_run_in_background(self):
+        """Multi-year summaries always answer 202; exports on request"""
+        start = (periods.today() - timedelta(days=800)).isoformat()
+        response = self.client.get(f'/api/expenses/summary/?start_date={start}')
+        assert response.status_code == status.HTTP_202_ACCEPTED
+        assert response.data['params']['start_date'] == start
+        assert self.client.get('/api/expenses/summary/?period=quarter').status_code == status.HTTP_200_OK
+        
+        response = self.client.get('/api/expenses/export/?format=csv&category=Travel&background=1')
+        assert response.status_code == status.HTTP_202_ACCEPTED
+        assert self.client.get('/api/expenses/export/?format=ndjson&layout=columnar&background=1').status_code == \
+            status.HTTP_400_BAD_REQUEST
+        self.run_worker()
+        
+        summary = json.loads(b''.join(self.client.get(f'/api/jobs/{Job.objects.get(kind="summary").pk}/download/')
+                                      .streaming_content))
+        assert summary['total_amount'] == 52.5
+        download = self.client.get(f"/api/jobs/{response.data['id']}/download/")
+        assert download['Content-Type'] == 'text/csv'
+        lines = b''.join(download.streaming_content).decode().splitlines()
+        assert len(lines) == 2 and 'Old train,40.00,Travel' in lines[1]
+    
+    def test_retries_and_leases(self, settings, monkeypatch):
+        """Failures are retried with backoff; a dead worker's job is taken over"""
+        settings.EXPENSE_JOB_MAX_ATTEMPTS = 2
+        job = jobs.enqueue(self.user, 'monthly_stats')
+        
+        def broken(user, params, out):
+            raise RuntimeError('database is down')
+        monkeypatch.setitem(jobs.JOB_KINDS, 'monthly_stats', jobs.JobKind(broken, 'application/json', 'json'))
+        assert jobs.run_job(jobs.claim_next('w1').pk, 'w1') == Job.QUEUED
+        job.refresh_from_db()
+        assert (job.attempts, job.error) == (1, 'RuntimeError: database is down')
+        assert job.run_after > timezone.now()
+        assert jobs.claim_next('w1') is None  # backing off
+        
+        # w1 claims it again and dies: once the lease runs out, the last attempt fails
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        assert jobs.claim_next('w1').attempts == 2
+        Job.objects.filter(pk=job.pk).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+        assert jobs.claim_next('w2') is None
+        assert jobs.fail_abandoned() == 1
+        assert Job.objects.get(pk=job.pk).status == Job.FAILED
+        
+        # an expired lease with attempts left goes to the next worker; the old one can't finish it
+        monkeypatch.undo()
+        settings.EXPENSE_JOB_MAX_ATTEMPTS = 3
+        job = jobs.enqueue(self.user, 'summary', {'start_date': '2020-01-01', 'end_date': '2020-12-31'})
+        jobs.claim_next('w1')
+        Job.objects.filter(pk=job.pk).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+        assert jobs.claim_next('w2').worker == 'w2'
+        assert jobs.run_job(job.pk, 'w1') is None
+        assert jobs.run_job(job.pk, 'w2') == Job.SUCCEEDED
+    
+    def test_one_pending_job_per_params(self, monkeypatch):
+        """The database refuses a second identical pending job; enqueue returns the first"""
+        job = jobs.enqueue(self.user, 'monthly_stats')
+        with pytest.raises(IntegrityError), transaction.atomic():
+            Job.objects.create(user=self.user, kind='monthly_stats', params={}, params_key=job.params_key)
+        
+        # a concurrent request that also found nothing pending loses the insert
+        first = QuerySet.first
+        misses = [None]
+        monkeypatch.setattr(QuerySet, 'first', lambda qs: misses.pop() if misses else first(qs))
+        assert jobs.enqueue(self.user, 'monthly_stats') == job
+        monkeypatch.undo()
+        
+        # other integrity errors (nothing pending to fall back on) are raised, not retried
+        inserts = []
+        
+        def failing_create(**kwargs):
+            inserts.append(kwargs)
+            raise IntegrityError('NOT NULL constraint failed')
+        monkeypatch.setattr(Job.objects, 'create', failing_create)
+        with pytest.raises(IntegrityError):
+            jobs.enqueue(self.user, 'summary')
+        assert len(inserts) == 1
+        monkeypatch.undo()
+        
+        # once finished, the same report can be queued again
+        Job.objects.filter(pk=job.pk).update(status=Job.SUCCEEDED)
+        assert jobs.enqueue(self.user, 'monthly_stats') != job
+        assert Job.objects.filter(user=self.user).count() == 2
+    
+    def test_worker_deletes_expired_jobs_and_files(self, settings):
+        """Finished jobs are deleted with their result files after EXPENSE_JOB_RESULT_DAYS"""
+        settings.EXPENSE_JOB_RESULT_DAYS = 2
+        old = jobs.enqueue(self.user, 'monthly_stats')
+        recent = jobs.enqueue(self.user, 'summary', {'start_date': '2020-01-01', 'end_date': '2020-12-31'})
+        self.run_worker()
+        old.refresh_from_db()
+        assert old.result.storage.exists(old.result.name)
+        Job.objects.filter(pk=old.pk).update(finished_at=timezone.now() - timedelta(days=3))
+        queued = jobs.enqueue(self.user, 'export_csv')
+        Job.objects.filter(pk=queued.pk).update(run_after=timezone.now() + timedelta(days=1))
+        
+        self.run_worker()
+        assert not old.result.storage.exists(old.result.name)
+        assert set(Job.objects.values_list('pk', flat=True)) == {recent.pk, queued.pk}
+
+
 @pytest.mark.django_db
 class TestProfileAPI:
     """Test suite for Profile API endpoints"""
@@ -0,0 +1,99 @@
+"""
+Out-of-core training of the expense categorizer.
+
+Labelled rows are streamed from the Expense table in chunks through a
+stateless HashingVectorizer into SGDClassifier.partial_fit, so memory stays
+bounded at any table size. A fixed slice of rows (by primary key) is held
+out for evaluation and never trained on.
+"""
+import time
+
+from django.db.models.functions import Mod
+from django.utils import timezone
+
+from .ai_utils import normalize_text
+from .models import Expense
+
+TRAINER = 'hashing-sgd'
+CLASSES = [choice for choice, _ in Expense.CATEGORY_CHOICES]
+N_FEATURES = 2 ** 18
+
+
+def build_pipeline():
+    from sklearn.feature_extraction.text import HashingVectorizer
+    from sklearn.linear_model import SGDClassifier
+
+    vectorizer = HashingVectorizer(n_features=N_FEATURES, ngram_range=(1, 2), alternate_sign=False, norm='l2')
+    model = SGDClassifier(loss='log_loss', alpha=1e-5, random_state=0)
+    return vectorizer, model
+
+
+def labelled_rows(include_predicted=False, changed_since=None):
+    """
+    Expenses usable as training labels. By default only categories chosen by
+    users (category_model_version is NULL), not the classifier's own answers.
+    """
+    qs = Expense.objects.all()
+    if not include_predicted:
+        qs = qs.filter(category_model_version__isnull=True)
+    if changed_since is not None:
+        qs = qs.filter(updated_at__gt=changed_since)
+    return qs
+
+
+def _holdout_split(qs, holdout_every):
+    """Return (training, holdout) querysets split deterministically on the primary key."""
+    qs = qs.annotate(holdout_bucket=Mod('id', holdout_every))
+    return qs.exclude(holdout_bucket=0), qs.filter(holdout_bucket=0)
+
+
+def _chunks(qs, chunk_size):
+    """Yield (texts, labels) chunks from a server-side cursor."""
+    texts, labels = [], []
+    rows = qs.order_by('pk').values_list('title', 'description', 'category')
+    for title, description, category in rows.iterator(chunk_size=chunk_size):
+        texts.append(normalize_text(f"{title} {description or ''}"))
+        labels.append(category)
+        if len(texts) >= chunk_size:
+            yield texts, labels
+            texts, labels = [], []
+    if texts:
+        yield texts, labels
+
+
+def train(qs, vectorizer, model, chunk_size=5000, epochs=1, holdout_every=10, evaluate_on=None):
+    """
+    Fit `model` on the non-holdout rows of `qs` with partial_fit, then score
+    it on the holdout rows of `evaluate_on` (default: `qs`).
+    Returns training statistics for the artifact's metadata.
+    """
+    started = time.perf_counter()
+    # Rows written from here on are left to the next incremental run, which
+    # starts after this mark; reading the newest updated_at once training is
+    # done would skip rows saved meanwhile without training on them.
+    cutoff = timezone.now()
+    training, _ = _holdout_split(qs.filter(updated_at__lte=cutoff), holdout_every)
+    _, holdout = _holdout_split(qs if evaluate_on is None else evaluate_on, holdout_every)
+    trained_rows = 0
+    for _ in range(epochs):
+        for texts, labels in _chunks(training, chunk_size):
+            model.partial_fit(vectorizer.transform(texts), labels, classes=CLASSES)
+            trained_rows += len(texts)
+    train_seconds = time.perf_counter() - started
+
+    correct = evaluated = 0
+    if hasattr(model, 'classes_'):
+        for texts, labels in _chunks(holdout, chunk_size):
+            predictions = model.predict(vectorizer.transform(texts))
+            correct += sum(1 for predicted, label in zip(predictions, labels) if predicted == label)
+            evaluated += len(labels)
+
+    return {
+        'trained_rows': trained_rows,
+        'epochs': epochs,
+        'holdout_rows': evaluated,
+        'holdout_accuracy': round(correct / evaluated, 4) if evaluated else None,
+        'train_seconds': round(train_seconds, 3),
+        'rows_per_second': round(trained_rows / train_seconds) if train_seconds else None,
+        'trained_until': cutoff,
+    }
@@ -1,4 +1,3 @@
-from datetime import timedelta
 from django.shortcuts import render, get_object_or_404, redirect
 from django.http import JsonResponse
 from django.contrib.auth.views import LoginView, LogoutView
@@ -8,14 +7,17 @@ from django.contrib.auth.models import User
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib import messages
 from django.db.models import Sum
-from django.db.models.functions import TruncDay, TruncWeek, TruncMonth, TruncYear
-from .models import Expense, Profile
+from .models import Expense, ExpenseDailyRollup, Profile
 from .forms import ExpenseForm, ProfileForm
 from .chatbot_utils import process_chat_query
-import calendar
+from .api_views import wants_background
+from .grouping import bucket_days, expense_rows, group_totals, with_expenses
+from .caching import cached, request_data_version
+from .money import from_cents
+from . import jobs, live
 import json
 from django.db import IntegrityError, transaction
-from .ai_utils import predict_category
+from .ai_utils import predict_categories
 
 def signup(request):
     form = UserCreationForm()
@@ -43,14 +45,18 @@ class CustomLogoutView(LogoutView):
 def expense_list(request):
     expenses = Expense.objects.filter(user=request.user).order_by('-date')
     
-    # Calculate stats
-    total_amount = expenses.aggregate(Sum('amount'))['amount__sum'] or 0
-    avg_amount = (total_amount / expenses.count()) if expenses.count() > 0 else 0
+    # Calculate stats from the daily rollups (cached until the user's data changes)
+    stats = cached(request.user.id, 'expense_list', (), lambda: ExpenseDailyRollup.objects.filter(
+        user=request.user).aggregate(total=Sum('total_cents'), count=Sum('count')))
+    total_amount = from_cents(stats['total'])
+    expense_count = stats['count'] or 0
+    avg_amount = (total_amount / expense_count) if expense_count > 0 else 0
     
     return render(request, 'expenses/expense_list.html', {
         'expenses': expenses,
         'total_amount': total_amount,
-        'avg_amount': round(avg_amount, 2)
+        'avg_amount': round(avg_amount, 2),
+        'live_updates': live.live_updates(request),
     })
 
 @login_required
@@ -63,7 +69,9 @@ def expense_create(request):
             expense.user = request.user
             # Always predict category if not provided
             if not expense.category:
-                predicted = predict_category((expense.title or '') + ' ' + (expense.description or ''))
+                [predicted], version = predict_categories(
+                    [(expense.title or '') + ' ' + (expense.description or '')], return_version=True)
+                expense.category_model_version = version
                 if predicted and predicted != 'Other':
                     expense.category = predicted
                     messages.info(request, f"Predicted category: {predicted}")
@@ -80,6 +88,9 @@ def expense_update(request, pk):
         form = ExpenseForm(request.POST, instance=expense)
         if form.is_valid():
             expense = form.save(commit=False)
+            if 'category' in form.changed_data:
+                # a manual correction: no longer the classifier's answer
+                expense.category_model_version = None
             form.save()
             return redirect('expense_list')
     else:
@@ -147,97 +158,37 @@ def password_change(request):
 def expense_summary(request):
     filter_type = request.GET.get('filter', 'daily')
     selected_category = request.GET.get('category', 'All')
-    grouped_expenses = []
 
-    # base queryset filtered by user and optionally category
+    # base querysets filtered by user and optionally category
     base_qs = Expense.objects.filter(user=request.user)
+    rollup_qs = ExpenseDailyRollup.objects.filter(user=request.user)
     if selected_category and selected_category != 'All':
         base_qs = base_qs.filter(category=selected_category)
-
-    total_amount = base_qs.aggregate(total=Sum('amount'))['total'] or 0
+        rollup_qs = rollup_qs.filter(category=selected_category)
+
+    def compute():
+        total = from_cents(rollup_qs.aggregate(total=Sum('total_cents'))['total'])
+        # one query over the daily rollups, streamed into day/week/month/year buckets
+        return total, group_totals(rollup_qs, filter_type)
+
+    # only the totals are cached; the listed expenses are read for each request,
+    # or by a background job when they span too long (report_job until it's done)
+    total_amount, buckets = cached(
+        request.user.id, 'expense_summary',
+        (('filter', filter_type), ('category', selected_category)), compute)
+    report_job = None
+    if wants_background(request, bucket_days(buckets)):
+        rows, report_job = jobs.summary_page_rows(request.user, selected_category, request_data_version(request))
+    else:
+        rows = expense_rows(base_qs)
+    grouped_expenses = with_expenses(buckets, rows)
 
     # categories for filter dropdown
     categories = [c[0] for c in Expense.CATEGORY_CHOICES]
 
-    if filter_type == 'daily':
-        qs = (
-            base_qs
-            .annotate(day=TruncDay('date'))
-            .values('day')
-            .annotate(total=Sum('amount'))
-            .order_by('day')
-        )
-        for i, group in enumerate(qs, 1):
-            expenses = base_qs.filter(date=group['day'])
-            grouped_expenses.append({
-                'serial': f"D{i}",
-                'range': group['day'].strftime('%d-%m-%Y'),
-                'total': group['total'],
-                'expenses': expenses
-            })
-
-    elif filter_type == 'weekly':
-        qs = (
-            base_qs
-            .annotate(week=TruncWeek('date'))
-            .values('week')
-            .annotate(total=Sum('amount'))
-            .order_by('week')
-        )
-        for i, group in enumerate(qs, 1):
-            week_start = group['week']
-            week_end = week_start + timedelta(days=6)
-            expenses = base_qs.filter(date__gte=week_start, date__lte=week_end)
-            grouped_expenses.append({
-                'serial': f"W{i}",
-                'range': f"{week_start.strftime('%d-%m-%Y')} to {week_end.strftime('%d-%m-%Y')}",
-                'total': group['total'],
-                'expenses': expenses
-            })
-
-    elif filter_type == 'monthly':
-        qs = (
-            base_qs
-            .annotate(month=TruncMonth('date'))
-            .values('month')
-            .annotate(total=Sum('amount'))
-            .order_by('month')
-        )
-        for i, group in enumerate(qs, 1):
-            month_start = group['month']
-            last_day = calendar.monthrange(month_start.year, month_start.month)[1]
-            month_end = month_start.replace(day=last_day)
-            expenses = base_qs.filter(date__year=month_start.year, date__month=month_start.month)
-            month_name = calendar.month_name[month_start.month]
-            grouped_expenses.append({
-                'serial': f"M{i}",
-                'range': f"{month_start.strftime('%d-%m-%Y')} to {month_end.strftime('%d-%m-%Y')}",
-                'total': group['total'],
-                'expenses': expenses
-            })
-
-    elif filter_type == 'yearly':
-        qs = (
-            base_qs
-            .annotate(year=TruncYear('date'))
-            .values('year')
-            .annotate(total=Sum('amount'))
-            .order_by('year')
-        )
-        for i, group in enumerate(qs, 1):
-            year_start = group['year']
-            year_end = year_start.replace(month=12, day=31)
-            expenses = base_qs.filter(date__year=year_start.year)
-            grouped_expenses.append({
-                'serial': f"Y{i}",
-                'range': f"{year_start.strftime('%d-%m-%Y')} to {year_end.strftime('%d-%m-%Y')}",
-                'total': group['total'],
-                'expenses': expenses
-            })
-
-    # prepare chart data from grouped_expenses
-    chart_labels = [g['range'] for g in grouped_expenses]
-    chart_data = [float(g['total'] or 0) for g in grouped_expenses]
+    # prepare chart data from the bucket totals
+    chart_labels = [g['range'] for g in buckets]
+    chart_data = [float(g['total'] or 0) for g in buckets]
 
     context = {
         'grouped_expenses': grouped_expenses,
@@ -247,6 +198,8 @@ def expense_summary(request):
         'selected_category': selected_category,
         'chart_labels_json': json.dumps(chart_labels),
         'chart_data_json': json.dumps(chart_data),
+        'live_updates': live.live_updates(request),
+        'report_job': report_job,
     }
 
     return render(request, 'expenses/expense_summary.html', context)
\ No newline at end of file
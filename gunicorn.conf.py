@@ -0,0 +1,26 @@
+"""
+Gunicorn configuration for Expense Tracker.
+
+    gunicorn expense_tracker.wsgi:application -c gunicorn.conf.py
+
+The app (and, unless EXPENSE_CLASSIFIER_PRELOAD=False, the expense
+classifier) is loaded once in the master process. Workers are forked from
+it and share those pages copy-on-write instead of each unpickling the model.
+"""
+import gc
+import multiprocessing
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+preload_app = True
+
+
+def when_ready(server):
+    if os.environ.get('EXPENSE_CLASSIFIER_PRELOAD', 'True') == 'True':
+        from expenses.ai_utils import preload_model
+        if preload_model():
+            server.log.info("Expense classifier preloaded in master")
+    # Move everything loaded so far out of the GC's reach, so collections in
+    # the workers don't write to (and un-share) the inherited pages.
+    gc.freeze()